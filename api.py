@@ -0,0 +1,314 @@
+import base64
+import binascii
+import gzip
+import json
+from datetime import datetime
+import brotli
+import orjson
+from flask import Blueprint, current_app, request
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+from autocomplete import artist_names, venue_names
+from cache import cache
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_MINUTES
+from pages import show_namespaces
+from scheduling import Booking, book_shows, find_conflicts, is_conflict_error
+
+#----------------------------------------------------------------------------#
+# JSON API (v1).
+#----------------------------------------------------------------------------#
+
+# JSON endpoints for venues, artists and shows, registered under /api/v1. They
+# are read-only but for POST /shows, booking a batch of shows, and POST
+# /shows/conflicts, checking proposed shows. Each query selects only the
+# columns named in ?fields= (all of them by default) and lists are paginated
+# with an opaque ?cursor= holding the sort key of the last row returned. Bodies
+# are encoded with orjson, and compressed with brotli or gzip when the client
+# accepts it. /venues/autocomplete and /artists/autocomplete
+# suggest names for the show forms.
+
+api = Blueprint('api', __name__)
+
+
+class ApiError(Exception):
+  def __init__(self, message, status=400):
+    super().__init__(message)
+    self.message = message
+    self.status = status
+
+
+# Selectable fields of each resource.
+VENUE_FIELDS = {
+  'id': Venue.id,
+  'name': Venue.name,
+  'city': Venue.city,
+  'state': Venue.state,
+  'address': Venue.address,
+  'phone': Venue.phone,
+  'image_link': Venue.image_link,
+  'genres': Venue.genres,
+  'facebook_link': Venue.facebook_link,
+  'website_link': Venue.website_link,
+  'seeking_talent': Venue.seeking_talent,
+  'seeking_description': Venue.seeking_description,
+  'latitude': Venue.latitude,
+  'longitude': Venue.longitude,
+  'updated_at': Venue.updated_at,
+  'num_upcoming_shows': Venue.upcoming_shows_count,
+}
+
+ARTIST_FIELDS = {
+  'id': Artist.id,
+  'name': Artist.name,
+  'city': Artist.city,
+  'state': Artist.state,
+  'phone': Artist.phone,
+  'genres': Artist.genres,
+  'image_link': Artist.image_link,
+  'facebook_link': Artist.facebook_link,
+  'website_link': Artist.website_link,
+  'seeking_venues': Artist.seeking_venues,
+  'seeking_description': Artist.seeking_description,
+  'updated_at': Artist.updated_at,
+  'num_upcoming_shows': Artist.upcoming_shows_count,
+}
+
+SHOW_FIELDS = {
+  'id': Show.id,
+  'start_time': Show.start_time,
+  'duration_minutes': Show.duration_minutes,
+  'updated_at': Show.updated_at,
+  'venue_id': Show.venue_id,
+  'venue_name': Venue.name,
+  'venue_image_link': Venue.image_link,
+  'artist_id': Show.artist_id,
+  'artist_name': Artist.name,
+  'artist_image_link': Artist.image_link,
+}
+
+
+def selected_fields(available, required=()):
+  """Names from ?fields= (all by default), plus the ones the query needs itself."""
+  fields = request.args.get('fields')
+  names = [name.strip() for name in fields.split(',') if name.strip()] if fields else list(available)
+  unknown = [name for name in names if name not in available]
+  if unknown:
+    raise ApiError('Unknown fields: {}'.format(', '.join(unknown)))
+  return names, [name for name in required if name not in names]
+
+
+def columns(available, names):
+  return [available[name].label(name) for name in names]
+
+
+def page_size():
+  limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+  return max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+
+
+def encode_cursor(values):
+  raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+  return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, types):
+  """Sort key values of a cursor, each converted by the matching function in `types`."""
+  try:
+    values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    if len(values) != len(types):
+      raise ValueError(cursor)
+    return [convert(value) for convert, value in zip(types, values)]
+  except (binascii.Error, TypeError, ValueError):
+    raise ApiError('Invalid cursor.')
+
+
+def read_bookings():
+  """The shows of a {"shows": [...]} JSON body, as Booking tuples.
+
+  Each show has a venue_id, an artist_id, a start_time (ISO 8601, local time)
+  and optionally a duration_minutes.
+  """
+  body = request.get_json(silent=True)
+  shows = body.get('shows') if isinstance(body, dict) else None
+  if not isinstance(shows, list) or not shows:
+    raise ApiError('Expected a JSON body {"shows": [...]} with at least one show.')
+  if len(shows) > current_app.config['BOOKING_BATCH_LIMIT']:
+    raise ApiError('At most {} shows per request.'.format(current_app.config['BOOKING_BATCH_LIMIT']))
+  bookings = []
+  for index, show in enumerate(shows):
+    try:
+      booking = Booking(
+        int(show['venue_id']),
+        int(show['artist_id']),
+        datetime.fromisoformat(show['start_time']),
+        int(show.get('duration_minutes', DEFAULT_SHOW_MINUTES)))
+      if booking.start_time.tzinfo is not None or booking.duration_minutes <= 0:
+        raise ValueError(show)
+    except (AttributeError, KeyError, TypeError, ValueError):
+      raise ApiError('Invalid show at index {}.'.format(index))
+    bookings.append(booking)
+  return bookings
+
+
+def dumps(data):
+  return orjson.dumps(data)
+
+
+def json_response(data, status=200):
+  body = dumps(data)
+  encoding = None
+  if len(body) >= current_app.config['API_COMPRESS_MIN_SIZE']:
+    accepted = request.accept_encodings
+    if accepted['br']:
+      body, encoding = brotli.compress(body), 'br'
+    elif accepted['gzip']:
+      body, encoding = gzip.compress(body, compresslevel=6), 'gzip'
+  response = current_app.response_class(body, status=status, mimetype='application/json')
+  if encoding:
+    response.headers['Content-Encoding'] = encoding
+  response.vary.add('Accept-Encoding')
+  return response
+
+
+def rows(records, names):
+  return [{name: getattr(record, name) for name in names} for record in records]
+
+
+def list_by_id(model, available):
+  names, extra = selected_fields(available, required=['id'])
+  query = db.session.query(*columns(available, names + extra)).order_by(model.id)
+  cursor = request.args.get('cursor')
+  if cursor:
+    last_id, = decode_cursor(cursor, (int,))
+    query = query.filter(model.id > last_id)
+  limit = page_size()
+  records = query.limit(limit + 1).all()
+  next_cursor = encode_cursor([records[limit - 1].id]) if len(records) > limit else None
+  return json_response({'data': rows(records[:limit], names), 'next_cursor': next_cursor})
+
+
+def get_by_id(model, available, id):
+  names, _ = selected_fields(available)
+  record = db.session.query(*columns(available, names)).filter(model.id == id).first()
+  if record is None:
+    raise ApiError('Not found.', 404)
+  return json_response({'data': rows([record], names)[0]})
+
+
+def suggestions(index):
+  # The ?q= prefix is matched against every word of the names.
+  limit = max(1, min(request.args.get('limit', current_app.config['AUTOCOMPLETE_LIMIT'], type=int),
+                     current_app.config['AUTOCOMPLETE_LIMIT']))
+  matches = index.lookup(request.args.get('q', ''), limit)
+  return json_response({'data': [{'id': id, 'name': name} for id, name in matches]})
+
+
+def show_query(names):
+  query = db.session.query(*columns(SHOW_FIELDS, names)).select_from(Show)
+  # Join the venue and artist only when one of their columns was asked for.
+  if any(name.startswith('venue_') and name != 'venue_id' for name in names):
+    query = query.join(Venue, Venue.id == Show.venue_id)
+  if any(name.startswith('artist_') and name != 'artist_id' for name in names):
+    query = query.join(Artist, Artist.id == Show.artist_id)
+  return query
+
+
+@api.errorhandler(ApiError)
+def api_error(error):
+  return json_response({'error': error.message}, error.status)
+
+
+@api.route('/venues')
+def venues():
+  return list_by_id(Venue, VENUE_FIELDS)
+
+
+@api.route('/venues/autocomplete')
+def venue_suggestions():
+  return suggestions(venue_names)
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+  return get_by_id(Venue, VENUE_FIELDS, venue_id)
+
+
+@api.route('/artists')
+def artists():
+  return list_by_id(Artist, ARTIST_FIELDS)
+
+
+@api.route('/artists/autocomplete')
+def artist_suggestions():
+  return suggestions(artist_names)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+  return get_by_id(Artist, ARTIST_FIELDS, artist_id)
+
+
+@api.route('/shows')
+def shows():
+  # Ordered by (start_time, id) like the /shows page; ?upcoming=1 starts from now.
+  names, extra = selected_fields(SHOW_FIELDS, required=['start_time', 'id'])
+  query = show_query(names + extra).order_by(Show.start_time, Show.id)
+  if request.args.get('upcoming'):
+    query = query.filter(Show.start_time > datetime.now())
+  cursor = request.args.get('cursor')
+  if cursor:
+    start_time, show_id = decode_cursor(cursor, (datetime.fromisoformat, int))
+    query = query.filter(tuple_(Show.start_time, Show.id) > tuple_(start_time, show_id))
+  limit = page_size()
+  records = query.limit(limit + 1).all()
+  next_cursor = None
+  if len(records) > limit:
+    next_cursor = encode_cursor([records[limit - 1].start_time, records[limit - 1].id])
+  return json_response({'data': rows(records[:limit], names), 'next_cursor': next_cursor})
+
+
+@api.route('/shows', methods=['POST'])
+def create_shows():
+  # Books the shows that can be booked, in one transaction, and reports on
+  # each: the id of the new show, or null with the unknown ids and conflicts.
+  bookings = read_bookings()
+  outcomes = book_shows(bookings)
+  try:
+    db.session.commit()
+  except IntegrityError as e:
+    db.session.rollback()
+    if is_conflict_error(e):
+      raise ApiError('A venue or an artist was just booked at one of these times; nothing was booked.', 409)
+    raise
+  cache.invalidate(*show_namespaces(
+    [booking for booking, outcome in zip(bookings, outcomes) if outcome.show_id is not None]))
+  return json_response({'data': [
+    {
+      'id': outcome.show_id,
+      'unknown': [kind for kind, name in (('venue', outcome.venue_name), ('artist', outcome.artist_name))
+                  if name is None],
+      'conflicts': [conflict._asdict() for conflict in outcome.conflicts],
+    }
+    for outcome in outcomes
+  ]})
+
+
+@api.route('/shows/conflicts', methods=['POST'])
+def show_conflicts():
+  # Checks proposed shows without booking them: for each one, the shows of
+  # its venue or artist it overlaps, and the earlier shows of the request it
+  # overlaps ("booking" is their index).
+  conflicts = find_conflicts(read_bookings())
+  return json_response({'data': [
+    {'conflicts': [conflict._asdict() for conflict in booking_conflicts]}
+    for booking_conflicts in conflicts
+  ]})
+
+
+@api.route('/shows/<int:show_id>')
+def show(show_id):
+  names, _ = selected_fields(SHOW_FIELDS)
+  record = show_query(names).filter(Show.id == show_id).first()
+  if record is None:
+    raise ApiError('Not found.', 404)
+  return json_response({'data': rows([record], names)[0]})
@@ -0,0 +1,158 @@
+import sys
+from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
+from sqlalchemy.orm import noload
+import queries
+from autocomplete import artist_names
+from cache import cache
+from calendars import calendar_response, calendar_validators
+from conditional import conditional
+from jobs import enqueue
+from models import db, Venue, Artist, Show
+from pages import (artist_namespaces, artist_page, catalog_facets, catalog_filters, detail_validators,
+  listing_validators, search_results, split_shows, touch_shows)
+from search import search, search_condition
+
+#----------------------------------------------------------------------------#
+# Artist routes.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('artists', __name__)
+
+@bp.route('/artists')
+@conditional(lambda: listing_validators(Artist))
+@cache.cached('artists')
+def artists():
+  # Filtered and faceted like the venues.
+  filters = catalog_filters()
+  conditions = queries.catalog_conditions(Artist, filters)
+  data = db.session.execute(queries.artist_list_query(conditions)).all()
+  facet_rows = db.session.execute(
+    queries.facet_counts_query(Artist, conditions, current_app.config['CATALOG_FACET_LIMIT'])).all()
+  return render_template('pages/artists.html', artists=data, facets=catalog_facets(facet_rows, filters))
+
+@bp.route('/artists/search', methods=['GET', 'POST'])
+def search_artists():
+  search_term = request.values.get('search_term', '')
+  filters = catalog_filters()
+  conditions = queries.catalog_conditions(Artist, filters)
+  artists = search(Artist, search_term, current_app.config['SEARCH_RESULTS_LIMIT'], conditions)
+  response = search_results(artists)
+  facet_rows = db.session.execute(queries.facet_counts_query(
+    Artist, conditions + [search_condition(Artist, search_term)[0]], current_app.config['CATALOG_FACET_LIMIT'])).all()
+  facets = catalog_facets(facet_rows, filters, search_term=search_term)
+  return render_template('pages/search_artists.html', results=response, search_term=search_term, facets=facets)
+
+@bp.route('/artists/<int:artist_id>')
+@conditional(lambda artist_id: detail_validators(Artist, Show.artist_id, artist_id))
+@cache.cached('artist:{artist_id}')
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id
+  artist = Artist.query.get_or_404(artist_id)
+  page = request.args.get('page', 1, type=int)
+  shows = split_shows(Show.artist_id, artist_id, Venue, Show.venue_id, page)
+  data = artist_page(artist, shows, page)
+  return render_template('pages/show_artist.html', artist=data)
+
+#  Update
+#  ----------------------------------------------------------------
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+  from forms import ArtistForm
+  
+  try:
+    artist = Artist.query.options(noload(Artist.shows)).filter_by(id=artist_id).first()
+    form = ArtistForm(obj=artist)
+    form.populate_obj(artist)
+    db.session.commit()
+
+  except:
+    db.session.rollback()
+  finally:
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+  from forms import ArtistForm
+  form = ArtistForm(request.form)
+  try: 
+    artist = Artist.query.options(noload(Artist.shows)).filter_by(id=artist_id).first()
+    image_link = artist.image_link
+    artist.name=form.name.data
+    artist.city=form.city.data
+    artist.state=form.state.data
+    artist.phone=form.phone.data
+    artist.genres=form.genres.data
+    artist.image_link=form.image_link.data
+    artist.facebook_link=form.facebook_link.data
+    artist.website_link=form.website_link.data
+    artist.seeking_venues=form.seeking_venue.data
+    artist.seeking_description=form.seeking_description.data
+    touch_shows(Show.artist_id, artist_id)
+    namespaces = artist_namespaces(artist_id)
+    if artist.image_link and artist.image_link != image_link:
+      enqueue('check_image_link', kind='artist', id=artist_id)
+    db.session.commit()
+  except: 
+    db.session.rollback()
+  else:
+    cache.invalidate(*namespaces)
+    artist_names.put(artist_id, form.name.data)
+  finally: 
+    db.session.close()
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+@bp.route('/artists/<int:artist_id>/calendar.ics')
+@conditional(lambda artist_id: calendar_validators(Artist, Show.artist_id, artist_id))
+def artist_calendar(artist_id):
+  # iCalendar feed of the artist's shows; ?since=<Sync-Token> for the changes only.
+  return calendar_response(Artist, Show.artist_id, artist_id)
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+  from forms import ArtistForm
+  form = ArtistForm()
+  return render_template('forms/new_artist.html', form=form)
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+  from forms import ArtistForm
+  data={}
+  error = False
+  form = ArtistForm(request.form)
+  try: 
+    artist = Artist(
+      name=form.name.data,
+      city=form.city.data,
+      state=form.state.data,
+      phone=form.phone.data,
+      genres=form.genres.data,
+      image_link=form.image_link.data,
+      facebook_link=form.facebook_link.data,
+      website_link=form.website_link.data,
+      seeking_venues=form.seeking_venue.data,
+      seeking_description=form.seeking_description.data
+    )
+    db.session.add(artist)
+    db.session.flush()
+    artist_id = artist.id
+    if artist.image_link:
+      enqueue('check_image_link', kind='artist', id=artist_id)
+    db.session.commit()
+
+  except:
+    error = True
+    db.session.rollback 
+    print(sys.exc_info())
+  else:
+    cache.invalidate('artists')
+    artist_names.put(artist_id, form.name.data)
+  finally:
+    db.session.close()
+    if error: 
+      flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
+    else: 
+      flash('Artist ' + request.form['name'] + ' was successfully listed!')
+    return render_template('pages/home.html')
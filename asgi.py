@@ -0,0 +1,309 @@
+import asyncio
+import re
+from collections import namedtuple
+from datetime import datetime
+from urllib.parse import quote
+from flask import abort, render_template, request, session as flask_session
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+import queries
+from app import create_app
+from cache import cache
+from conditional import add_validators, not_modified, validators
+from models import Venue, Artist, Show
+from pages import (artist_page, catalog_facets, catalog_filters, feed_page, parse_show_cursor, search_results,
+  venue_areas, venue_page)
+from search import search_condition, search_query
+
+#----------------------------------------------------------------------------#
+# Async serving.
+#----------------------------------------------------------------------------#
+
+# Fyyur as an ASGI application, for an event loop server:
+#
+#     uvicorn asgi:application --workers 4
+#
+# The read pages (venue and artist listings, detail pages and searches, and
+# the /shows feed) are served by the async views below. They run the same
+# statements as the Flask views (queries.py) through SQLAlchemy's asyncio
+# extension on asyncpg, so a worker keeps serving other requests while one
+# waits on the database, then render the same templates inside a Flask
+# request context. They honour the page cache and conditional GETs like their
+# Flask counterparts. Every other request (forms, writes, the JSON API, static
+# files, /shows?stream=1) is handed to the Flask app in a thread of the
+# event loop's default executor.
+
+app = create_app()
+
+
+def async_database_uri(uri):
+  # postgresql://... or postgresql+psycopg2://... -> postgresql+asyncpg://...
+  return re.sub(r'^postgres(ql)?(\+\w+)?://', 'postgresql+asyncpg://', uri)
+
+
+engine = create_async_engine(
+  app.config.get('ASYNC_DATABASE_URI') or async_database_uri(app.config['SQLALCHEMY_DATABASE_URI']),
+  pool_size=app.config['ASYNC_POOL_SIZE'],
+  max_overflow=0,
+  pool_pre_ping=app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('pool_pre_ping', False),
+  pool_recycle=app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('pool_recycle', -1),
+)
+Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+AsyncView = namedtuple('AsyncView', 'coroutine namespaces get_validators sync_if')
+
+# Async views by the endpoint of the Flask view they replace.
+VIEWS = {}
+
+
+def async_view(endpoint, namespaces=None, get_validators=None, sync_if=None):
+  """Serve `endpoint` with the decorated coroutine instead of the Flask view.
+
+  The coroutine is called with an AsyncSession and the view arguments and
+  returns the rendered page. `namespaces` and `get_validators` stand for the
+  Flask view's @cache.cached and @conditional decorators, except that
+  `get_validators(**view_args)` returns the statement whose row the
+  validators are computed from. Requests for which `sync_if(request)` is true
+  are left to the Flask view.
+  """
+  def decorator(coroutine):
+    VIEWS[endpoint] = AsyncView(coroutine, namespaces, get_validators, sync_if)
+    return coroutine
+  return decorator
+
+#----------------------------------------------------------------------------#
+# Async views.
+#----------------------------------------------------------------------------#
+
+async def split_shows(db_session, owner_fk, owner_id, counterpart, counterpart_fk, page=1):
+  # Same as pages.split_shows.
+  now = datetime.now()
+  per_page = app.config['SHOWS_PER_PAGE']
+  past_count, upcoming_count = (await db_session.execute(
+    queries.show_counts_query(owner_fk, owner_id, now))).one()
+  upcoming = (await db_session.execute(queries.owner_shows_query(
+    owner_fk, owner_id, counterpart, counterpart_fk, now, True, 1, per_page))).all()
+  past = (await db_session.execute(queries.owner_shows_query(
+    owner_fk, owner_id, counterpart, counterpart_fk, now, False, page, per_page))).all()
+  return past, upcoming, past_count, upcoming_count
+
+
+@async_view('venues.venues', namespaces=['venues'],
+  get_validators=lambda: queries.listing_validators_query(Venue))
+async def venues(db_session):
+  filters = catalog_filters()
+  conditions = queries.catalog_conditions(Venue, filters)
+  rows = (await db_session.execute(queries.venue_areas_query(conditions))).all()
+  facet_rows = (await db_session.execute(
+    queries.facet_counts_query(Venue, conditions, app.config['CATALOG_FACET_LIMIT']))).all()
+  return render_template('pages/venues.html', areas=venue_areas(rows), facets=catalog_facets(facet_rows, filters))
+
+
+@async_view('venues.search_venues')
+async def search_venues(db_session):
+  search_term = request.values.get('search_term', '')
+  filters = catalog_filters()
+  conditions = queries.catalog_conditions(Venue, filters)
+  rows = (await db_session.execute(
+    search_query(Venue, search_term, app.config['SEARCH_RESULTS_LIMIT'], conditions))).all()
+  facet_rows = (await db_session.execute(queries.facet_counts_query(
+    Venue, conditions + [search_condition(Venue, search_term)[0]], app.config['CATALOG_FACET_LIMIT']))).all()
+  return render_template('pages/search_venues.html', results=search_results(rows), search_term=search_term,
+    facets=catalog_facets(facet_rows, filters, search_term=search_term))
+
+
+@async_view('venues.show_venue', namespaces=['venue:{venue_id}'],
+  get_validators=lambda venue_id: queries.detail_validators_query(Venue, Show.venue_id, venue_id, datetime.now()))
+async def show_venue(db_session, venue_id):
+  venue = await db_session.get(Venue, venue_id)
+  if venue is None:
+    abort(404)
+  page = request.args.get('page', 1, type=int)
+  shows = await split_shows(db_session, Show.venue_id, venue_id, Artist, Show.artist_id, page)
+  return render_template('pages/show_venue.html', venue=venue_page(venue, shows, page))
+
+
+@async_view('artists.artists', namespaces=['artists'],
+  get_validators=lambda: queries.listing_validators_query(Artist))
+async def artists(db_session):
+  filters = catalog_filters()
+  conditions = queries.catalog_conditions(Artist, filters)
+  data = (await db_session.execute(queries.artist_list_query(conditions))).all()
+  facet_rows = (await db_session.execute(
+    queries.facet_counts_query(Artist, conditions, app.config['CATALOG_FACET_LIMIT']))).all()
+  return render_template('pages/artists.html', artists=data, facets=catalog_facets(facet_rows, filters))
+
+
+@async_view('artists.search_artists')
+async def search_artists(db_session):
+  search_term = request.values.get('search_term', '')
+  filters = catalog_filters()
+  conditions = queries.catalog_conditions(Artist, filters)
+  rows = (await db_session.execute(
+    search_query(Artist, search_term, app.config['SEARCH_RESULTS_LIMIT'], conditions))).all()
+  facet_rows = (await db_session.execute(queries.facet_counts_query(
+    Artist, conditions + [search_condition(Artist, search_term)[0]], app.config['CATALOG_FACET_LIMIT']))).all()
+  return render_template('pages/search_artists.html', results=search_results(rows), search_term=search_term,
+    facets=catalog_facets(facet_rows, filters, search_term=search_term))
+
+
+@async_view('artists.show_artist', namespaces=['artist:{artist_id}'],
+  get_validators=lambda artist_id: queries.detail_validators_query(Artist, Show.artist_id, artist_id, datetime.now()))
+async def show_artist(db_session, artist_id):
+  artist = await db_session.get(Artist, artist_id)
+  if artist is None:
+    abort(404)
+  page = request.args.get('page', 1, type=int)
+  shows = await split_shows(db_session, Show.artist_id, artist_id, Venue, Show.venue_id, page)
+  return render_template('pages/show_artist.html', artist=artist_page(artist, shows, page))
+
+
+# Streaming the whole feed stays with the Flask view.
+@async_view('shows.shows', namespaces=['shows'],
+  get_validators=lambda: queries.listing_validators_query(Show),
+  sync_if=lambda request: request.args.get('stream'))
+async def shows(db_session):
+  after = request.args.get('after')
+  query = queries.show_feed_query(parse_show_cursor(after) if after else None)
+  rows = (await db_session.execute(query.limit(app.config['SHOWS_PER_PAGE'] + 1))).all()
+  data, next_cursor = feed_page(rows)
+  return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
+
+#----------------------------------------------------------------------------#
+# ASGI application.
+#----------------------------------------------------------------------------#
+
+async def read_body(receive):
+  body = b''
+  while True:
+    message = await receive()
+    body += message.get('body', b'')
+    if not message.get('more_body'):
+      return body
+
+
+def build_environ(scope, body):
+  headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']]
+  host = dict(headers).get('host') or '{}:{}'.format(*scope['server'])
+  client = scope.get('client') or ('', 0)
+  return EnvironBuilder(
+    path=quote(scope['path']),
+    base_url='{}://{}{}'.format(scope.get('scheme', 'http'), host, scope.get('root_path', '')),
+    query_string=scope['query_string'].decode('latin-1'),
+    method=scope['method'],
+    headers=headers,
+    data=body,
+    environ_overrides={'REMOTE_ADDR': client[0], 'REMOTE_PORT': client[1]},
+  ).get_environ()
+
+
+async def dispatch(view, view_args):
+  # What @conditional and @cache.cached do for the Flask views.
+  async with Session() as db_session:
+    if flask_session.get('_flashes'):
+      return await view.coroutine(db_session, **view_args)
+
+    if view.get_validators is not None:
+      row = (await db_session.execute(view.get_validators(**view_args))).one()
+      etag, last_modified = validators(row)
+      if not_modified(etag, last_modified):
+        return add_validators(app.response_class(status=304), etag, last_modified)
+
+    body = None
+    if view.namespaces is not None:
+      key = cache.key(view.namespaces, view_args)
+      body = cache.get(key)
+    if body is None:
+      body = await view.coroutine(db_session, **view_args)
+      if view.namespaces is not None:
+        cache.set(key, body)
+
+    response = app.make_response(body)
+    if view.get_validators is not None:
+      add_validators(response, etag, last_modified)
+    return response
+
+
+async def serve(view, view_args, environ):
+  # Flask's request handling (Flask.wsgi_app and full_dispatch_request)
+  # around an async view.
+  with app.request_context(environ):
+    try:
+      try:
+        rv = app.preprocess_request()
+        if rv is None:
+          rv = await dispatch(view, view_args)
+      except Exception as e:
+        rv = app.handle_user_exception(e)
+      return app.finalize_request(rv)
+    except Exception as e:
+      return app.handle_exception(e)
+
+
+def serve_wsgi(environ, send):
+  # Runs in an executor thread; `send` blocks until the event loop sent the message.
+  started = {}
+
+  def start_response(status, headers, exc_info=None):
+    started['status'] = int(status.split(' ', 1)[0])
+    started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+  def start():
+    if not started.get('sent'):
+      send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+      started['sent'] = True
+
+  iterable = app(environ, start_response)
+  try:
+    for chunk in iterable:
+      if chunk:
+        start()
+        send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    start()
+    send({'type': 'http.response.body', 'body': b''})
+  finally:
+    if hasattr(iterable, 'close'):
+      iterable.close()
+
+
+async def lifespan(receive, send):
+  while True:
+    message = await receive()
+    if message['type'] == 'lifespan.startup':
+      await send({'type': 'lifespan.startup.complete'})
+    elif message['type'] == 'lifespan.shutdown':
+      await engine.dispose()
+      await send({'type': 'lifespan.shutdown.complete'})
+      return
+
+
+async def application(scope, receive, send):
+  if scope['type'] == 'lifespan':
+    return await lifespan(receive, send)
+  if scope['type'] != 'http':
+    raise ValueError('Unsupported ASGI scope type: {}'.format(scope['type']))
+
+  environ = build_environ(scope, await read_body(receive))
+  try:
+    endpoint, view_args = app.url_map.bind_to_environ(environ).match()
+  except HTTPException:
+    endpoint = None
+  view = VIEWS.get(endpoint)
+
+  if view is None or (view.sync_if is not None and view.sync_if(Request(environ))):
+    loop = asyncio.get_running_loop()
+    send_from_thread = lambda message: asyncio.run_coroutine_threadsafe(send(message), loop).result()
+    await loop.run_in_executor(None, serve_wsgi, environ, send_from_thread)
+    return
+
+  response = await serve(view, view_args, environ)
+  await send({
+    'type': 'http.response.start',
+    'status': response.status_code,
+    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in response.headers.to_wsgi_list()],
+  })
+  await send({'type': 'http.response.body', 'body': response.get_data()})
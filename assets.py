@@ -0,0 +1,233 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import time
+import brotli
+import click
+from flask import Blueprint, abort, current_app, request, send_file, send_from_directory, url_for
+from flask.cli import with_appcontext
+from werkzeug.security import safe_join
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+
+# Pages load their CSS and JavaScript as a few bundles of the files in
+# static/, and every asset under a name carrying a hash of its content, so a
+# browser can keep it for a year without asking again: a new version gets a
+# new name. Build steps write them to ASSETS_BUILD_DIR, with a manifest from
+# names to hashed names and brotli and gzip variants of the text files:
+#
+#     flask build-assets
+#
+# Templates link them with asset_url('css/site.css'). The app serves them under
+# /assets with `Cache-Control: immutable`, picking the precompressed variant
+# the browser accepts. Without a build, or in debug mode, the same URLs serve
+# the bundles put together on each request from static/, uncached.
+
+# Bundles of files of static/, in order.
+BUNDLES = {
+  'css/site.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css', 'css/main.responsive.css',
+                   'css/main.quickfix.css'],
+  'css/form.css': ['css/bootstrap.min.css', 'css/bootstrap-theme.min.css', 'css/layout.main.css',
+                   'css/main.css', 'css/main.responsive.css', 'css/main.quickfix.css'],
+  # In <head>.
+  'js/head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+  # At the end of <body>; jQuery first, Bootstrap needs it.
+  'js/site.js': ['js/libs/jquery-1.11.1.min.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js', 'js/script.js'],
+}
+
+# Extensions of the files worth compressing; images and woff fonts already are.
+COMPRESSIBLE = {'.css', '.js', '.map', '.svg', '.ttf', '.otf', '.eot', '.json', '.txt'}
+
+MANIFEST = 'manifest.json'
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+CSS_TOKEN = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*(?!!).*?\*/|\s+''', re.S)
+SOURCE_MAP = re.compile(r'^//[#@] sourceMappingURL=.*$', re.M)
+
+assets = Blueprint('assets', __name__)
+
+
+def init_assets(app):
+  # The manifest of the last build, or None to serve static/ as it is.
+  manifest = None
+  path = os.path.join(app.config['ASSETS_BUILD_DIR'], MANIFEST)
+  if not app.debug and os.path.exists(path):
+    with open(path) as f:
+      manifest = json.load(f)
+    manifest['files'] = set(manifest['assets'].values())
+  app.extensions['assets'] = manifest
+  app.add_template_global(asset_url)
+  app.register_blueprint(assets, url_prefix='/assets')
+
+
+def asset_url(name):
+  """URL of the bundle or static/ file `name`, under its hashed name once built."""
+  manifest = current_app.extensions['assets']
+  return url_for('assets.asset', filename=manifest['assets'][name] if manifest is not None else name)
+
+
+def rewrite_css_urls(css, source, target, hashed):
+  # Points the relative url()s of `source` at the hashed names of their files,
+  # relative to `target`, where the CSS ends up.
+  def rewrite(match):
+    url = match.group(2).strip()
+    if url.startswith(('data:', '/', '#')) or '://' in url:
+      return match.group(0)
+    path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+    name = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+    if name not in hashed:
+      return match.group(0)
+    return 'url("{}{}")'.format(posixpath.relpath(hashed[name], posixpath.dirname(target)), suffix)
+  return CSS_URL.sub(rewrite, css)
+
+
+def minify_css(css):
+  # Drops comments (but /*! licences) and the whitespace around punctuation;
+  # strings are left alone.
+  def token(match):
+    if match.group(1):
+      return match.group(1)
+    if match.group(0).startswith('/*'):
+      return ''
+    before, after = css[match.start() - 1:match.start()], css[match.end():match.end() + 1]
+    if not before or not after or before in '{};,:>(' or after in '{};,>)!':
+      return ''
+    return ' '
+  return CSS_TOKEN.sub(token, css)
+
+
+def read_static(name):
+  with open(safe_join(current_app.static_folder, name), 'rb') as f:
+    return f.read()
+
+
+def bundle(name, hashed=None):
+  """The content of bundle `name`; with `hashed`, its CSS points at those files and is minified."""
+  parts = []
+  for source in BUNDLES[name]:
+    text = read_static(source).decode('utf-8')
+    if name.endswith('.css'):
+      if hashed is not None:
+        text = minify_css(rewrite_css_urls(text, source, name, hashed))
+    else:
+      # The maps of the minified libraries don't match the bundle.
+      text = SOURCE_MAP.sub('', text).rstrip() + ';'
+    parts.append(text)
+  return '\n'.join(parts).encode('utf-8')
+
+
+def write_file(path, data):
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  temporary = '{}.{}.tmp'.format(path, os.getpid())
+  with open(temporary, 'wb') as f:
+    f.write(data)
+  os.replace(temporary, path)
+
+
+def write_asset(build_dir, name, data, written):
+  """Write `data` under the hashed name of `name` with its compressed variants; return that name and their encodings."""
+  root, extension = posixpath.splitext(name)
+  hashed = '{}.{}{}'.format(root, hashlib.sha256(data).hexdigest()[:12], extension)
+  path = os.path.join(build_dir, hashed)
+  # Most preferred encoding first.
+  variants = {'': data}
+  if extension in COMPRESSIBLE:
+    variants['.br'] = brotli.compress(data, quality=11)
+    variants['.gz'] = gzip.compress(data, compresslevel=9, mtime=0)
+  encodings = []
+  for suffix, content in variants.items():
+    # A variant is only kept when it is smaller.
+    if suffix and len(content) >= len(data):
+      continue
+    if not os.path.exists(path + suffix):
+      write_file(path + suffix, content)
+    written.add(hashed + suffix)
+    if suffix:
+      encodings.append({'.br': 'br', '.gz': 'gzip'}[suffix])
+  return hashed, encodings
+
+
+def build_assets(build_dir, clean=False):
+  """Write every static/ file and bundle to `build_dir` under its hashed name; return the manifest."""
+  sources = []
+  for directory, _, files in os.walk(current_app.static_folder):
+    for file in files:
+      name = os.path.relpath(os.path.join(directory, file), current_app.static_folder).replace(os.sep, '/')
+      if not file.startswith('.'):
+        sources.append(name)
+  # CSS last, so it can point at the hashed fonts and images.
+  sources.sort(key=lambda name: (name.endswith('.css'), name))
+
+  manifest = {'assets': {}, 'encodings': {}}
+  written = set()
+  for name in sources:
+    data = read_static(name)
+    if name.endswith('.css'):
+      data = minify_css(rewrite_css_urls(data.decode('utf-8'), name, name, manifest['assets'])).encode('utf-8')
+    elif name.endswith('.js'):
+      data = SOURCE_MAP.sub('', data.decode('utf-8')).encode('utf-8')
+    manifest['assets'][name], manifest['encodings'][name] = write_asset(build_dir, name, data, written)
+  for name in BUNDLES:
+    manifest['assets'][name], manifest['encodings'][name] = \
+      write_asset(build_dir, name, bundle(name, manifest['assets']), written)
+  manifest['encodings'] = {manifest['assets'][name]: encodings
+                           for name, encodings in manifest['encodings'].items() if encodings}
+
+  if clean:
+    # Pages cached or kept by browsers from before the build may still link
+    # the old files, so they are only removed on demand.
+    for directory, _, files in os.walk(build_dir):
+      for file in files:
+        name = os.path.relpath(os.path.join(directory, file), build_dir).replace(os.sep, '/')
+        if name != MANIFEST and name not in written:
+          os.remove(os.path.join(directory, file))
+  write_file(os.path.join(build_dir, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode())
+  return manifest
+
+
+@assets.route('/<path:filename>')
+def asset(filename):
+  manifest = current_app.extensions['assets']
+  mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+  if manifest is None:
+    if filename in BUNDLES:
+      response = current_app.response_class(bundle(filename), mimetype=mimetype)
+    else:
+      response = send_from_directory(current_app.static_folder, filename, mimetype=mimetype)
+    response.cache_control.no_cache = True
+    return response
+
+  if filename not in manifest['files']:
+    abort(404)
+  encodings = manifest['encodings'].get(filename, ())
+  encoding = next((encoding for encoding in encodings if request.accept_encodings[encoding]), None)
+  path = safe_join(current_app.config['ASSETS_BUILD_DIR'], filename)
+  if encoding is not None:
+    path += {'br': '.br', 'gzip': '.gz'}[encoding]
+  response = send_file(path, mimetype=mimetype, download_name=posixpath.basename(filename), conditional=True,
+                       max_age=current_app.config['ASSETS_MAX_AGE'])
+  response.cache_control.public = True
+  response.cache_control.immutable = True
+  if encoding is not None:
+    response.headers['Content-Encoding'] = encoding
+  if encodings:
+    response.vary.add('Accept-Encoding')
+  return response
+
+
+@click.command('build-assets')
+@click.option('--clean', is_flag=True, help='Remove the files of earlier builds.')
+@with_appcontext
+def build_assets_command(clean):
+  """Bundle, fingerprint and precompress the static files."""
+  started = time.perf_counter()
+  build_dir = current_app.config['ASSETS_BUILD_DIR']
+  manifest = build_assets(build_dir, clean)
+  click.echo('Built {} assets into {} in {:.2f}s.'.format(
+    len(manifest['assets']), build_dir, time.perf_counter() - started))
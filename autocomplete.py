@@ -0,0 +1,155 @@
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from flask import current_app
+from sqlalchemy import func, select
+from cache import cache
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Name autocomplete.
+#----------------------------------------------------------------------------#
+
+# The show forms look venues and artists up by name as the booker types. Each
+# process keeps the names in memory, as a sorted list of (key, id) pairs with
+# a key per word of a name ("the blue note", "blue note", "note"), so every
+# keystroke is a bisect into the list instead of a query.
+#
+# The create, edit and delete handlers update the index of their own process
+# and bump its cache namespace ('venue-names' or 'artist-names'); the other
+# processes see the bump (with CACHE_TYPE=redis) or the index's age reaching
+# AUTOCOMPLETE_MAX_AGE, and rebuild their index in a background thread. While
+# a process has no index yet, lookups fall back to a query matching the same
+# word prefixes (name ~* '\mprefix'), answered by the name trigram index.
+
+WORD_START = re.compile(r'(?<!\w)\w')
+# Characters special in PostgreSQL regular expressions.
+REGEX_SPECIAL = re.compile(r'([.^$*+?()\[\]{}|\\])')
+
+
+def normalize(text):
+  return ' '.join(text.lower().split())
+
+
+def name_keys(name):
+  text = normalize(name)
+  return {text[match.start():] for match in WORD_START.finditer(text)}
+
+
+class NameIndex(object):
+  """Prefix index of the names of `model`, invalidated through the cache namespace `namespace`."""
+
+  def __init__(self, model, namespace):
+    self.model = model
+    self.namespace = namespace
+    self._entries = []
+    self._names = {}
+    # Namespace versions the entries reflect, None until the first build.
+    self._versions = None
+    self._built_at = 0
+    self._building = False
+    self._lock = threading.Lock()
+
+  def versions(self):
+    return cache.version('*'), cache.version(self.namespace)
+
+  def is_stale(self):
+    return self._versions != self.versions() or \
+      time.monotonic() - self._built_at > current_app.config['AUTOCOMPLETE_MAX_AGE']
+
+  def build(self):
+    """Load every name of the table; the other processes' changes are picked up from here."""
+    versions = self.versions()
+    self.load(dict(db.session.execute(select(self.model.id, self.model.name)).all()), versions)
+
+  def load(self, names, versions=None):
+    """Replace the index with `names`, a dict of id to name, current as of the namespace `versions`."""
+    entries = sorted((key, id) for id, name in names.items() for key in name_keys(name))
+    with self._lock:
+      self._entries, self._names = entries, names
+      self._versions, self._built_at = versions or self.versions(), time.monotonic()
+
+  def refresh(self):
+    # One build at a time, off the request.
+    with self._lock:
+      if self._building:
+        return
+      self._building = True
+    app = current_app._get_current_object()
+
+    def run():
+      try:
+        with app.app_context():
+          self.build()
+      except Exception:
+        app.logger.exception('Could not build the %s index', self.namespace)
+      finally:
+        self._building = False
+    threading.Thread(target=run, daemon=True).start()
+
+  def _remove(self, id):
+    name = self._names.pop(id, None)
+    if name is not None:
+      for key in name_keys(name):
+        index = bisect_left(self._entries, (key, id))
+        if index < len(self._entries) and self._entries[index] == (key, id):
+          del self._entries[index]
+
+  def put(self, id, name):
+    """Add or rename the record `id`; call after its transaction commits."""
+    cache.invalidate(self.namespace)
+    with self._lock:
+      if self._versions is None:
+        return
+      self._remove(id)
+      self._names[id] = name
+      for key in name_keys(name):
+        insort(self._entries, (key, id))
+      self._versions = self.versions()
+
+  def delete(self, id):
+    """Drop the record `id`; call after its transaction commits."""
+    cache.invalidate(self.namespace)
+    with self._lock:
+      if self._versions is None:
+        return
+      self._remove(id)
+      self._versions = self.versions()
+
+  def lookup(self, prefix, limit):
+    """Up to `limit` (id, name) pairs of the names with a word starting with `prefix`."""
+    prefix = normalize(prefix)
+    if not prefix:
+      return []
+    if self.is_stale():
+      self.refresh()
+    if self._versions is None:
+      return self.query(prefix, limit)
+    matches = {}
+    with self._lock:
+      index = bisect_left(self._entries, (prefix,))
+      while len(matches) < limit and index < len(self._entries):
+        key, id = self._entries[index]
+        if not key.startswith(prefix):
+          break
+        matches.setdefault(id, self._names[id])
+        index += 1
+    return list(matches.items())
+
+  def query(self, prefix, limit):
+    # Names with a word starting with `prefix`, like lookup(), answered by the
+    # ix_<table>_name_trgm index; ordered by the name from that word on, as
+    # the index keys are.
+    pattern = '\\m' + '\\s+'.join(REGEX_SPECIAL.sub(r'\\\1', word) for word in prefix.split(' '))
+    name = func.lower(self.model.name)
+    return db.session.execute(
+      select(self.model.id, self.model.name)
+        .where(self.model.name.op('~*')(pattern))
+        .order_by(func.substring(name, '(' + pattern + '.*)'), self.model.id)
+        .limit(limit)
+    ).all()
+
+
+venue_names = NameIndex(Venue, 'venue-names')
+artist_names = NameIndex(Artist, 'artist-names')
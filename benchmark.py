@@ -0,0 +1,533 @@
+"""Benchmarks for Fyyur.
+
+    python benchmark.py routes [--requests N] [--output FILE] [--compare FILE]
+    python benchmark.py concurrency [--clients N] [--duration S] [--workers N] [--mode sync|async|both]
+    python benchmark.py filters [--values N] [--rounds N]
+    python benchmark.py startup [--runs N] [--output FILE] [--compare FILE]
+    python benchmark.py autocomplete [--names N] [--words N]
+
+`routes` drives every page of the app through the Flask test client against
+the configured database (fill it first with `flask seed`) and records, per
+route, the p50/p99 latency, the SQL statements per request and the peak
+Python memory allocated while serving it. Results are written as JSON, by
+default to benchmarks/<git commit>.json, so runs from different commits can be
+compared with --compare.
+
+`concurrency` starts the app under gunicorn (sync, WSGI) and/or uvicorn
+(async, asgi.py) with the same number of worker processes, then keeps
+--clients concurrent HTTP clients cycling through the read pages for
+--duration seconds and reports requests/sec and latency for each mode.
+
+`filters` times the `datetime` template filter on show times like the ones
+`flask seed` generates: the way pages used to call it (a string re-parsed,
+then formatted by babel.dates.format_datetime) against datetimes passed
+straight in, with an empty and with a warm memo.
+
+`startup` measures what a freshly started worker pays: in new processes, it
+times importing and creating the app and the first request to pages that
+need no database, without a template bytecode cache and with one filled by
+`flask compile-templates`. Medians over --runs processes are written to
+benchmarks/<git commit>-startup.json.
+
+`autocomplete` loads --names made-up venue names into the in-memory name
+index, without a database, then types --words of them one keystroke at a
+time into /api/v1/venues/autocomplete and reports the p50/p99 latency of the
+index lookup alone and of the whole request, against the 5 ms p99 target.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import socket
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+
+# (method, path, form data); {venue_id} and {artist_id} are filled with the
+# venue and artist that have the most shows, {show_id} with the first show.
+# The nearby pages look around New York, one of the cities `flask seed` uses.
+ROUTES = [
+  ('GET', '/', None),
+  ('GET', '/venues', None),
+  ('GET', '/artists', None),
+  ('GET', '/shows', None),
+  ('GET', '/shows?stream=1', None),
+  ('GET', '/venues/{venue_id}', None),
+  ('GET', '/artists/{artist_id}', None),
+  ('POST', '/venues/search', {'search_term': 'blue'}),
+  ('POST', '/artists/search', {'search_term': 'band'}),
+  ('GET', '/venues/{venue_id}/edit', None),
+  ('GET', '/artists/{artist_id}/edit', None),
+  ('GET', '/venues/create', None),
+  ('GET', '/artists/create', None),
+  ('GET', '/shows/create', None),
+  ('GET', '/venues/near?lat=40.7128&lng=-74.0060', None),
+  ('GET', '/shows/near?lat=40.7128&lng=-74.0060', None),
+  ('GET', '/venues/{venue_id}/calendar.ics', None),
+  ('GET', '/artists/{artist_id}/calendar.ics', None),
+  ('GET', '/api/v1/venues', None),
+  ('GET', '/api/v1/artists', None),
+  ('GET', '/api/v1/shows', None),
+  ('GET', '/api/v1/shows?upcoming=1&fields=start_time,venue_name,artist_name', None),
+  ('GET', '/api/v1/venues/{venue_id}', None),
+  ('GET', '/api/v1/artists/{artist_id}', None),
+  ('GET', '/api/v1/shows/{show_id}', None),
+  ('GET', '/api/v1/venues/autocomplete?q=blu', None),
+  ('GET', '/api/v1/artists/autocomplete?q=blu', None),
+]
+
+
+def git_commit():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return 'unknown'
+
+
+def percentile(values, fraction):
+  values = sorted(values)
+  return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def busiest(column):
+  from sqlalchemy import func
+  from models import db
+  return db.session.query(column).group_by(column).order_by(func.count().desc()).limit(1).scalar()
+
+
+def bench_routes(args):
+  if not args.cache:
+    os.environ['CACHE_TYPE'] = 'null'
+  from app import create_app
+  from models import db, Venue, Artist, Show
+  app = create_app()
+  app.config['SLOW_QUERY_THRESHOLD_MS'] = None
+
+  with app.app_context():
+    ids = {'venue_id': busiest(Show.venue_id), 'artist_id': busiest(Show.artist_id),
+           'show_id': db.session.query(db.func.min(Show.id)).scalar()}
+    if ids['venue_id'] is None:
+      sys.exit('The database has no shows; fill it with `flask seed` first.')
+    counts = {
+      'venues': Venue.query.count(),
+      'artists': Artist.query.count(),
+      'shows': Show.query.count(),
+    }
+    db.session.remove()
+
+  # Counted here rather than read from Server-Timing, which streamed pages
+  # don't carry.
+  from sqlalchemy import event
+  from sqlalchemy.engine import Engine
+  statements = []
+  event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(None))
+
+  client = app.test_client()
+  routes = {}
+  for method, path, data in ROUTES:
+    url = path.format(**ids)
+    latencies, queries = [], []
+    client.open(url, method=method, data=data).get_data()  # warm up
+    tracemalloc.start()
+    for _ in range(args.requests):
+      statements.clear()
+      started = time.perf_counter()
+      response = client.open(url, method=method, data=data)
+      response.get_data()
+      latencies.append((time.perf_counter() - started) * 1000)
+      queries.append(len(statements))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    result = routes['{} {}'.format(method, path)] = {
+      'status': response.status_code,
+      'p50_ms': round(percentile(latencies, 0.50), 3),
+      'p99_ms': round(percentile(latencies, 0.99), 3),
+      'queries_per_request': queries[-1],
+      'peak_memory_kb': round(peak / 1024, 1),
+    }
+    print('{:<48} {:>4}  p50 {:>9.2f} ms  p99 {:>9.2f} ms  {:>4} queries  {:>9.1f} KiB'.format(
+      method + ' ' + path, result['status'], result['p50_ms'], result['p99_ms'],
+      str(result['queries_per_request']), result['peak_memory_kb']))
+
+  commit = git_commit()
+  results = {
+    'commit': commit,
+    'date': datetime.now().isoformat(timespec='seconds'),
+    'python': platform.python_version(),
+    'requests_per_route': args.requests,
+    'cache': args.cache,
+    'rows': counts,
+    'routes': routes,
+  }
+  output = args.output or os.path.join(RESULTS_DIR, '{}.json'.format(commit))
+  os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+  with open(output, 'w') as f:
+    json.dump(results, f, indent=2, sort_keys=True)
+  print('Results written to {}'.format(output))
+
+  if args.compare:
+    compare(args.compare, results)
+
+
+# Read pages served by the async views in asgi.py; used by `concurrency`.
+CONCURRENCY_ROUTES = [
+  ('GET', '/venues', None),
+  ('GET', '/artists', None),
+  ('GET', '/shows', None),
+  ('GET', '/venues/{venue_id}', None),
+  ('GET', '/artists/{artist_id}', None),
+  ('POST', '/venues/search', 'search_term=blue'),
+  ('POST', '/artists/search', 'search_term=band'),
+]
+
+SERVERS = {
+  'sync': lambda address, workers: [
+    sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--workers', str(workers), '--bind', address],
+  'async': lambda address, workers: [
+    sys.executable, '-m', 'uvicorn', '--workers', str(workers), '--no-access-log',
+    '--host', address.split(':')[0], '--port', address.split(':')[1], 'asgi:application'],
+}
+
+
+def free_port():
+  with socket.socket() as s:
+    s.bind(('127.0.0.1', 0))
+    return s.getsockname()[1]
+
+
+async def fetch(host, port, method, path, body):
+  # One request on its own connection; returns the status code.
+  reader, writer = await asyncio.open_connection(host, port)
+  try:
+    headers = 'Host: {}:{}\r\nConnection: close\r\n'.format(host, port)
+    if body is not None:
+      headers += 'Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {}\r\n'.format(len(body))
+    writer.write('{} {} HTTP/1.1\r\n{}\r\n{}'.format(method, path, headers, body or '').encode())
+    await writer.drain()
+    response = await reader.read()
+    return int(response.split(b' ', 2)[1])
+  finally:
+    writer.close()
+
+
+async def wait_for_server(host, port, process, timeout=30):
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline:
+    if process.poll() is not None:
+      sys.exit('The server exited with status {}.'.format(process.returncode))
+    try:
+      await fetch(host, port, 'GET', '/', None)
+      return
+    except OSError:
+      await asyncio.sleep(0.2)
+  sys.exit('The server did not start within {}s.'.format(timeout))
+
+
+async def load(host, port, requests, clients, duration):
+  latencies, errors = [], 0
+  deadline = time.monotonic() + duration
+  cycle = itertools.cycle(requests)
+
+  async def client():
+    nonlocal errors
+    while time.monotonic() < deadline:
+      method, path, body = next(cycle)
+      started = time.perf_counter()
+      try:
+        status = await fetch(host, port, method, path, body)
+      except (OSError, ValueError, IndexError):
+        status = None
+      if status is not None and status < 400:
+        latencies.append((time.perf_counter() - started) * 1000)
+      else:
+        errors += 1
+
+  started = time.monotonic()
+  await asyncio.gather(*(client() for _ in range(clients)))
+  return latencies, errors, time.monotonic() - started
+
+
+def bench_concurrency(args):
+  # The servers inherit the environment.
+  if not args.cache:
+    os.environ['CACHE_TYPE'] = 'null'
+  from app import create_app
+  from models import Show
+  app = create_app()
+
+  with app.app_context():
+    ids = {'venue_id': busiest(Show.venue_id), 'artist_id': busiest(Show.artist_id)}
+  if ids['venue_id'] is None:
+    sys.exit('The database has no shows; fill it with `flask seed` first.')
+  requests = [(method, path.format(**ids), body) for method, path, body in CONCURRENCY_ROUTES]
+
+  modes = ['sync', 'async'] if args.mode == 'both' else [args.mode]
+  results = {}
+  for mode in modes:
+    host, port = '127.0.0.1', free_port()
+    command = SERVERS[mode]('{}:{}'.format(host, port), args.workers)
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+      asyncio.run(wait_for_server(host, port, process))
+      asyncio.run(load(host, port, requests, args.clients, min(2, args.duration)))  # warm up
+      latencies, errors, elapsed = asyncio.run(load(host, port, requests, args.clients, args.duration))
+    finally:
+      process.terminate()
+      process.wait()
+    result = results[mode] = {
+      'requests_per_sec': round(len(latencies) / elapsed, 1),
+      'p50_ms': round(percentile(latencies, 0.50), 3) if latencies else None,
+      'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None,
+      'errors': errors,
+    }
+    print('{:<6} {:>9.1f} req/s  p50 {:>9} ms  p99 {:>9} ms  {} errors'.format(
+      mode, result['requests_per_sec'], result['p50_ms'], result['p99_ms'], errors))
+
+  commit = git_commit()
+  output = args.output or os.path.join(RESULTS_DIR, '{}-concurrency.json'.format(commit))
+  os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+  with open(output, 'w') as f:
+    json.dump({
+      'commit': commit,
+      'date': datetime.now().isoformat(timespec='seconds'),
+      'python': platform.python_version(),
+      'clients': args.clients,
+      'duration_s': args.duration,
+      'workers': args.workers,
+      'cache': args.cache,
+      'modes': results,
+    }, f, indent=2, sort_keys=True)
+  print('Results written to {}'.format(output))
+
+
+def time_per_call(function, values, rounds):
+  best = None
+  for _ in range(rounds):
+    started = time.perf_counter()
+    for value in values:
+      function(value)
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best, elapsed)
+  return best / len(values) * 1e6
+
+
+def bench_filters(args):
+  import babel.dates
+  import dateutil.parser
+  from app import DATETIME_FORMATS, create_app
+
+  rng = random.Random(0)
+  today = datetime.now().replace(hour=20, minute=0, second=0, microsecond=0)
+  values = [today + timedelta(days=rng.randint(-730, 730), hours=rng.choice([-2, -1, 0, 1, 2]))
+            for _ in range(args.values)]
+  strings = [value.strftime('%m/%d/%Y, %H:%M') for value in values]
+  pattern = DATETIME_FORMATS['full']
+  format_datetime = create_app().jinja_env.filters['datetime']
+
+  def before(value):
+    return babel.dates.format_datetime(dateutil.parser.parse(value), pattern, locale='en')
+
+  def cold(value):
+    format_datetime.cache_clear()
+    return format_datetime(value, 'full')
+
+  results = [
+    ('string, parsed and formatted', time_per_call(before, strings, args.rounds)),
+    ('datetime, empty memo', time_per_call(cold, values, args.rounds)),
+    ('datetime, warm memo', time_per_call(lambda value: format_datetime(value, 'full'), values, args.rounds)),
+  ]
+  print('{} show times, {} distinct'.format(len(values), len(set(values))))
+  for name, micros in results:
+    print('{:<30} {:>8.2f} us/call  {:>6.1f}x'.format(name, micros, results[0][1] / micros))
+
+
+# Pages rendered without touching the database; used by `startup`.
+STARTUP_ROUTES = ['/', '/venues/create', '/artists/create', '/shows/create']
+
+# Run in a new process by `startup`, with the paths to request as arguments.
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+import_ms = (time.perf_counter() - started) * 1000
+client = app.test_client()
+first_request_ms = {}
+for path in sys.argv[1:]:
+  started = time.perf_counter()
+  client.get(path).get_data()
+  first_request_ms[path] = (time.perf_counter() - started) * 1000
+print(json.dumps({'import_ms': import_ms, 'first_request_ms': first_request_ms}))
+"""
+
+
+def start_worker(cache_dir):
+  root = os.path.dirname(os.path.abspath(__file__))
+  env = dict(os.environ, CACHE_TYPE='null', TEMPLATE_BYTECODE_CACHE_DIR=cache_dir)
+  output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT] + STARTUP_ROUTES,
+                                   cwd=root, env=env, text=True)
+  return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_startup(args):
+  root = os.path.dirname(os.path.abspath(__file__))
+  results = {}
+  with tempfile.TemporaryDirectory() as cache_dir:
+    subprocess.check_call([sys.executable, '-m', 'flask', 'compile-templates'], cwd=root,
+                          env=dict(os.environ, FLASK_APP='app', TEMPLATE_BYTECODE_CACHE_DIR=cache_dir),
+                          stdout=subprocess.DEVNULL)
+    for name, directory in (('no bytecode cache', ''), ('precompiled', cache_dir)):
+      runs = [start_worker(directory) for _ in range(args.runs)]
+      result = results[name] = {
+        'import_ms': round(statistics.median(run['import_ms'] for run in runs), 1),
+        'first_request_ms': {path: round(statistics.median(run['first_request_ms'][path] for run in runs), 1)
+                             for path in STARTUP_ROUTES},
+      }
+      print('{}: import {:.1f} ms'.format(name, result['import_ms']))
+      for path, ms in result['first_request_ms'].items():
+        print('  first GET {:<24} {:>8.1f} ms'.format(path, ms))
+
+  commit = git_commit()
+  output = args.output or os.path.join(RESULTS_DIR, '{}-startup.json'.format(commit))
+  os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+  with open(output, 'w') as f:
+    json.dump({
+      'commit': commit,
+      'date': datetime.now().isoformat(timespec='seconds'),
+      'python': platform.python_version(),
+      'runs': args.runs,
+      'modes': results,
+    }, f, indent=2, sort_keys=True)
+  print('Results written to {}'.format(output))
+
+  if args.compare:
+    with open(args.compare) as f:
+      baseline = json.load(f)
+    print('\nCompared with {} ({}):'.format(baseline['commit'], args.compare))
+    for name, current in results.items():
+      before = baseline['modes'].get(name)
+      if before is None:
+        continue
+      print('{}: import {:.1f} -> {:.1f} ms, first requests {:.1f} -> {:.1f} ms'.format(
+        name, before['import_ms'], current['import_ms'],
+        sum(before['first_request_ms'].values()), sum(current['first_request_ms'].values())))
+
+
+# p99 latency per keystroke the autocomplete endpoints are meant to stay under.
+AUTOCOMPLETE_TARGET_MS = 5
+
+NAME_WORDS = [
+  'the', 'blue', 'note', 'room', 'jazz', 'hall', 'club', 'park', 'square', 'theatre', 'garden', 'house', 'bar',
+  'lounge', 'red', 'rock', 'river', 'city', 'golden', 'gate', 'musical', 'hop', 'dueling', 'pianos', 'sound',
+  'stage', 'velvet', 'underground', 'electric', 'ballroom', 'crystal', 'palace', 'north', 'south', 'old', 'new',
+]
+
+
+def bench_autocomplete(args):
+  os.environ['CACHE_TYPE'] = 'null'
+  from app import create_app
+  from autocomplete import venue_names
+  app = create_app()
+  app.config['SLOW_QUERY_THRESHOLD_MS'] = None
+
+  rng = random.Random(0)
+  names = {id: '{} {}'.format(' '.join(rng.choice(NAME_WORDS).title() for _ in range(rng.randint(1, 3))), id)
+           for id in range(1, args.names + 1)}
+  with app.app_context():
+    started = time.perf_counter()
+    venue_names.load(names)
+    print('{} names indexed in {:.0f} ms'.format(len(names), (time.perf_counter() - started) * 1000))
+
+  # Each word is typed one letter at a time, as the form sends it.
+  prefixes = [word[:length] for word in (rng.choice(NAME_WORDS) for _ in range(args.words))
+              for length in range(1, len(word) + 1)]
+  limit = app.config['AUTOCOMPLETE_LIMIT']
+  lookups, requests = [], []
+  with app.test_request_context():
+    for prefix in prefixes:
+      started = time.perf_counter()
+      venue_names.lookup(prefix, limit)
+      lookups.append((time.perf_counter() - started) * 1000)
+  client = app.test_client()
+  for prefix in prefixes:
+    started = time.perf_counter()
+    response = client.get('/api/v1/venues/autocomplete', query_string={'q': prefix})
+    response.get_data()
+    requests.append((time.perf_counter() - started) * 1000)
+    if response.status_code != 200:
+      sys.exit('GET /api/v1/venues/autocomplete?q={} returned {}.'.format(prefix, response.status_code))
+
+  print('{} keystrokes, p99 target {} ms'.format(len(prefixes), AUTOCOMPLETE_TARGET_MS))
+  for name, latencies in (('index lookup', lookups), ('GET /api/v1/venues/autocomplete', requests)):
+    p99 = percentile(latencies, 0.99)
+    print('{:<32} p50 {:>7.3f} ms  p99 {:>7.3f} ms  {}'.format(
+      name, percentile(latencies, 0.50), p99, 'ok' if p99 < AUTOCOMPLETE_TARGET_MS else 'OVER TARGET'))
+
+
+def compare(path, results):
+  with open(path) as f:
+    baseline = json.load(f)
+  print('\nCompared with {} ({}):'.format(baseline['commit'], path))
+  for route, current in results['routes'].items():
+    before = baseline['routes'].get(route)
+    if before is None:
+      continue
+    print('{:<48} p50 {:>+8.1f}%  p99 {:>+8.1f}%  queries {} -> {}'.format(
+      route,
+      100.0 * (current['p50_ms'] - before['p50_ms']) / before['p50_ms'],
+      100.0 * (current['p99_ms'] - before['p99_ms']) / before['p99_ms'],
+      before['queries_per_request'], current['queries_per_request']))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  commands = parser.add_subparsers(dest='command', required=True)
+
+  routes = commands.add_parser('routes', help='Latency, queries and memory per route.')
+  routes.add_argument('--requests', type=int, default=50, help='Requests per route (default 50).')
+  routes.add_argument('--cache', action='store_true', help='Keep the page cache enabled.')
+  routes.add_argument('--output', help='Where to write the JSON results.')
+  routes.add_argument('--compare', help='Earlier JSON results to compare with.')
+  routes.set_defaults(run=bench_routes)
+
+  concurrency = commands.add_parser('concurrency', help='Requests/sec of the sync and async servers under load.')
+  concurrency.add_argument('--clients', type=int, default=200, help='Concurrent clients (default 200).')
+  concurrency.add_argument('--duration', type=float, default=20, help='Seconds of load per mode (default 20).')
+  concurrency.add_argument('--workers', type=int, default=4, help='Server worker processes (default 4).')
+  concurrency.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+  concurrency.add_argument('--cache', action='store_true', help='Keep the page cache enabled.')
+  concurrency.add_argument('--output', help='Where to write the JSON results.')
+  concurrency.set_defaults(run=bench_concurrency)
+
+  filters = commands.add_parser('filters', help='Cost of the datetime template filter.')
+  filters.add_argument('--values', type=int, default=5000, help='Show times formatted per round (default 5000).')
+  filters.add_argument('--rounds', type=int, default=5, help='Rounds; the fastest is reported (default 5).')
+  filters.set_defaults(run=bench_filters)
+
+  startup = commands.add_parser('startup', help='Import time and first requests of a new worker.')
+  startup.add_argument('--runs', type=int, default=10, help='Processes started per mode (default 10).')
+  startup.add_argument('--output', help='Where to write the JSON results.')
+  startup.add_argument('--compare', help='Earlier JSON results to compare with.')
+  startup.set_defaults(run=bench_startup)
+
+  autocomplete = commands.add_parser('autocomplete', help='Keystroke latency of the name autocomplete.')
+  autocomplete.add_argument('--names', type=int, default=100000, help='Names in the index (default 100000).')
+  autocomplete.add_argument('--words', type=int, default=500, help='Words typed, a keystroke at a time (default 500).')
+  autocomplete.set_defaults(run=bench_autocomplete)
+
+  args = parser.parse_args()
+  args.run(args)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,256 @@
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, text
+from cache import invalidate_from_command
+from counters import refresh_upcoming_counts
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_MINUTES
+from scheduling import Booking, find_conflicts
+
+#----------------------------------------------------------------------------#
+# Bulk import / export.
+#----------------------------------------------------------------------------#
+
+# CSV and JSON Lines files hold one venue, artist or show per row, using the
+# model's column names. In CSV, genres are comma separated within their cell.
+# Shows refer to their venue and artist by venue_id/artist_id, or by
+# venue_name/artist_name. Imports read the file in batches of --batch-size
+# rows and insert each batch with a single executemany INSERT, so memory
+# stays bounded and the database sees one round trip per batch. Shows that
+# would overlap another show of their venue or artist are skipped. Rows
+# missing a required value, or with a value that doesn't parse, are rejected
+# and reported by row number; the rest of the file is still imported.
+
+COLUMNS = {
+  'venues': (Venue, ['id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'genres',
+                     'facebook_link', 'website_link', 'seeking_talent', 'seeking_description']),
+  'artists': (Artist, ['id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+                       'facebook_link', 'website_link', 'seeking_venues', 'seeking_description']),
+  'shows': (Show, ['id', 'venue_id', 'artist_id', 'start_time', 'duration_minutes']),
+}
+
+
+def parse_value(column, value):
+  # Values from CSV are all strings; JSON Lines values may already be typed.
+  if value == '' or value is None:
+    return None
+  if column in ('id', 'venue_id', 'artist_id', 'duration_minutes'):
+    return int(value)
+  if column == 'genres':
+    return value if isinstance(value, list) else [genre.strip() for genre in value.split(',')]
+  if column in ('seeking_talent', 'seeking_venues'):
+    return value if isinstance(value, bool) else value.strip().lower() in ('1', 'true', 'yes', 'y')
+  if column == 'start_time':
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+  return value
+
+
+def required_columns(model, columns):
+  # NOT NULL columns without a default; shows may name their venue and artist instead.
+  return [column for column in columns[1:]
+          if not model.__table__.c[column].nullable and model.__table__.c[column].default is None
+          and model.__table__.c[column].server_default is None and column not in ('venue_id', 'artist_id')]
+
+
+def parse_row(raw, columns, required):
+  """The row's values by column, or raise ValueError saying what is wrong with it."""
+  row = {}
+  for column in columns:
+    try:
+      row[column] = parse_value(column, raw.get(column))
+    except (TypeError, ValueError):
+      raise ValueError('invalid {}: {!r}'.format(column, raw.get(column)))
+  missing = [column for column in required if row[column] is None]
+  if missing:
+    raise ValueError('missing {}'.format(', '.join(missing)))
+  return row
+
+
+def advance_id_sequence(model):
+  # Move the id sequence past the ids inserted so far, so the rows inserted
+  # without one next don't collide with them.
+  db.session.execute(text(
+    "SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), "
+    "(SELECT coalesce(max(id), 1) FROM \"{0}\"))".format(model.__tablename__)))
+
+
+def format_value(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  if isinstance(value, list):
+    return ','.join(value)
+  return value
+
+
+def read_rows(stream, file_format):
+  if file_format == 'csv':
+    yield from csv.DictReader(stream)
+  else:
+    for line in stream:
+      if line.strip():
+        yield json.loads(line)
+
+
+def batches(rows, size):
+  batch = []
+  for row in rows:
+    batch.append(row)
+    if len(batch) == size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+
+def resolve_ids(model, rows, id_key, name_key):
+  """Fill row[id_key] for a batch of show rows; return the rows that resolved.
+
+  Rows giving an id are checked with one IN query; rows giving only a name
+  are looked up with another. Names matching several rows resolve to the
+  lowest id.
+  """
+  ids = {row[id_key] for row in rows if row.get(id_key) is not None}
+  names = {row[name_key] for row in rows if row.get(id_key) is None and row.get(name_key)}
+  known_ids = set()
+  if ids:
+    known_ids = {id for id, in db.session.query(model.id).filter(model.id.in_(ids))}
+  ids_by_name = {}
+  if names:
+    ids_by_name = dict(
+      db.session.query(model.name, func.min(model.id))
+        .filter(model.name.in_(names))
+        .group_by(model.name)
+    )
+  resolved = []
+  for row in rows:
+    if row.get(id_key) is not None:
+      found = row[id_key] in known_ids
+    else:
+      row[id_key] = ids_by_name.get(row.get(name_key))
+      found = row[id_key] is not None
+    if found:
+      resolved.append(row)
+  return resolved
+
+
+def without_conflicts(rows):
+  """The show rows of a batch that overlap no show of their venue or artist, nor an earlier row."""
+  conflicts = find_conflicts([
+    Booking(row['venue_id'], row['artist_id'], row['start_time'], row['duration_minutes']) for row in rows])
+  return [row for row, row_conflicts in zip(rows, conflicts) if not row_conflicts]
+
+
+def guess_format(path, file_format):
+  if file_format:
+    return file_format
+  return 'csv' if path.endswith('.csv') else 'jsonl'
+
+
+@click.command('import-data')
+@click.argument('kind', type=click.Choice(sorted(COLUMNS)))
+@click.argument('path')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']),
+              help='File format; guessed from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows inserted per statement.')
+@with_appcontext
+def import_data(kind, path, file_format, batch_size):
+  """Load venues, artists or shows from a CSV or JSON Lines file ('-' for stdin)."""
+  model, columns = COLUMNS[kind]
+  required = required_columns(model, columns)
+  file_format = guess_format(path, file_format)
+  stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+  imported = skipped = overlapping = rejected = 0
+  started = time.perf_counter()
+  try:
+    for batch in batches(enumerate(read_rows(stream, file_format), 1), batch_size):
+      rows = []
+      for number, raw in batch:
+        try:
+          row = parse_row(raw, columns, required)
+        except ValueError as error:
+          rejected += 1
+          click.echo('Rejected row {}: {}.'.format(number, error), err=True)
+          continue
+        if kind == 'shows':
+          row['venue_name'] = raw.get('venue_name')
+          row['artist_name'] = raw.get('artist_name')
+          if row['duration_minutes'] is None:
+            row['duration_minutes'] = DEFAULT_SHOW_MINUTES
+        rows.append(row)
+
+      if kind == 'shows':
+        valid = resolve_ids(Venue, rows, 'venue_id', 'venue_name')
+        valid = resolve_ids(Artist, valid, 'artist_id', 'artist_name')
+        skipped += len(rows) - len(valid)
+        fitting = without_conflicts(valid)
+        overlapping += len(valid) - len(fitting)
+        rows = [{column: row[column] for column in columns} for row in fitting]
+
+      # One executemany per key set: rows that bring their own id and rows that don't.
+      with_ids = [row for row in rows if row['id'] is not None]
+      without_ids = [{column: row[column] for column in columns[1:]} for row in rows if row['id'] is None]
+      if with_ids:
+        db.session.execute(insert(model.__table__), with_ids)
+        advance_id_sequence(model)
+      if without_ids:
+        db.session.execute(insert(model.__table__), without_ids)
+      db.session.commit()
+
+      imported += len(rows)
+      elapsed = time.perf_counter() - started
+      click.echo('{}: {} rows, {:.0f} rows/s'.format(
+        kind, imported, imported / elapsed if elapsed else 0), err=True)
+  finally:
+    if stream is not sys.stdin:
+      stream.close()
+
+  if kind == 'shows':
+    # Imported past shows were counted as upcoming by the triggers.
+    refresh_upcoming_counts()
+  invalidate_from_command()
+
+  elapsed = time.perf_counter() - started
+  click.echo('Imported {} {} in {:.2f}s ({:.0f} rows/s), rejected {} invalid rows, skipped {} with unknown '
+             'venue or artist and {} overlapping other shows.'.format(
+    imported, kind, elapsed, imported / elapsed if elapsed else 0, rejected, skipped, overlapping))
+
+
+@click.command('export-data')
+@click.argument('kind', type=click.Choice(sorted(COLUMNS)))
+@click.argument('path')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']),
+              help='File format; guessed from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows fetched per round trip.')
+@with_appcontext
+def export_data(kind, path, file_format, batch_size):
+  """Write all venues, artists or shows to a CSV or JSON Lines file ('-' for stdout)."""
+  model, columns = COLUMNS[kind]
+  file_format = guess_format(path, file_format)
+  stream = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+  started = time.perf_counter()
+  exported = 0
+  try:
+    if file_format == 'csv':
+      writer = csv.writer(stream)
+      writer.writerow(columns)
+    query = db.session.query(*(getattr(model, column) for column in columns)) \
+      .order_by(model.id) \
+      .yield_per(batch_size)
+    for row in query:
+      values = [format_value(value) for value in row]
+      if file_format == 'csv':
+        writer.writerow(values)
+      else:
+        stream.write(json.dumps(dict(zip(columns, values))) + '\n')
+      exported += 1
+  finally:
+    if stream is not sys.stdout:
+      stream.close()
+
+  elapsed = time.perf_counter() - started
+  click.echo('Exported {} {} in {:.2f}s ({:.0f} rows/s).'.format(
+    exported, kind, elapsed, exported / elapsed if elapsed else 0), err=True)
@@ -0,0 +1,227 @@
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+import click
+import redis
+from flask import current_app, request, session
+
+#----------------------------------------------------------------------------#
+# Cache backends.
+#----------------------------------------------------------------------------#
+
+# A backend stores pickled-or-not values under string keys with a timeout in
+# seconds, and keeps integer counters (incr) that never expire. Counters hold
+# the namespace versions used for invalidation below.
+
+class LRUCache(object):
+  """In-process cache holding at most `maxsize` entries, least recently used first out."""
+
+  def __init__(self, maxsize=1024, default_timeout=60):
+    self.maxsize = maxsize
+    self.default_timeout = default_timeout
+    self._entries = OrderedDict()
+    self._counters = {}
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      expires, value = entry
+      if expires is not None and expires <= time.monotonic():
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, timeout=None):
+    timeout = self.default_timeout if timeout is None else timeout
+    expires = time.monotonic() + timeout if timeout else None
+    with self._lock:
+      self._entries[key] = (expires, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+
+  def delete(self, key):
+    with self._lock:
+      self._entries.pop(key, None)
+
+  def get_counter(self, key):
+    return self._counters.get(key, 0)
+
+  def incr(self, key):
+    with self._lock:
+      self._counters[key] = self._counters.get(key, 0) + 1
+      return self._counters[key]
+
+
+logger = logging.getLogger(__name__)
+
+
+class RedisCache(object):
+  """Cache shared by every worker, stored in Redis.
+
+  `client` is anything with the redis-py get/set/delete/incr methods, so a
+  local fake can stand in for a server. When Redis can't be reached the
+  error is logged and the cache acts as empty: reads miss, writes are lost,
+  and pages are built from the database.
+  """
+
+  def __init__(self, client, key_prefix='fyyur:', default_timeout=60):
+    self.client = client
+    self.key_prefix = key_prefix
+    self.default_timeout = default_timeout
+
+  @classmethod
+  def from_url(cls, url, **kwargs):
+    return cls(redis.Redis.from_url(url), **kwargs)
+
+  def _call(self, method, key, *args, **kwargs):
+    try:
+      return getattr(self.client, method)(self.key_prefix + key, *args, **kwargs)
+    except redis.RedisError as e:
+      logger.warning('Redis %s of %s failed: %s', method, key, e)
+      return None
+
+  def get(self, key):
+    value = self._call('get', key)
+    return None if value is None else pickle.loads(value)
+
+  def set(self, key, value, timeout=None):
+    timeout = self.default_timeout if timeout is None else timeout
+    self._call('set', key, pickle.dumps(value), ex=timeout or None)
+
+  def delete(self, key):
+    self._call('delete', key)
+
+  def get_counter(self, key):
+    return int(self._call('get', key) or 0)
+
+  def incr(self, key):
+    return self._call('incr', key)
+
+
+class NullCache(object):
+  """Caches nothing; used when CACHE_TYPE is 'null'."""
+
+  def get(self, key):
+    return None
+
+  def set(self, key, value, timeout=None):
+    pass
+
+  def delete(self, key):
+    pass
+
+  def get_counter(self, key):
+    return 0
+
+  def incr(self, key):
+    return 0
+
+#----------------------------------------------------------------------------#
+# View cache.
+#----------------------------------------------------------------------------#
+
+class ViewCache(object):
+  """Caches rendered pages, invalidated by namespace.
+
+  Every cached view names the namespaces its output depends on, such as
+  'venues' or 'venue:{venue_id}' (formatted with the view arguments). Each
+  namespace has a version counter that is part of the cache key, so
+  `invalidate('venue:3')` bumps the version and every page built from venue
+  3 misses on its next request. Entries also expire after
+  CACHE_DEFAULT_TIMEOUT seconds, since upcoming shows turn into past shows
+  without any write.
+  """
+
+  def __init__(self, app=None):
+    self.backend = NullCache()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    cache_type = app.config.get('CACHE_TYPE', 'lru')
+    timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+    if cache_type == 'lru':
+      self.backend = LRUCache(app.config.get('CACHE_MAXSIZE', 1024), timeout)
+    elif cache_type == 'redis':
+      self.backend = RedisCache.from_url(app.config['CACHE_REDIS_URL'], default_timeout=timeout)
+    elif cache_type == 'null':
+      self.backend = NullCache()
+    else:
+      raise ValueError('Unknown CACHE_TYPE: {}'.format(cache_type))
+    app.extensions['view_cache'] = self
+
+  @property
+  def shared(self):
+    # Whether invalidations reach the other processes: false for the 'lru'
+    # cache, kept by each process for itself.
+    return not isinstance(self.backend, LRUCache)
+
+  def get(self, key):
+    return self.backend.get(key)
+
+  def set(self, key, value, timeout=None):
+    self.backend.set(key, value, timeout)
+
+  def version(self, namespace):
+    return self.backend.get_counter('ns:' + namespace)
+
+  def invalidate(self, *namespaces):
+    for namespace in namespaces:
+      self.backend.incr('ns:' + namespace)
+
+  def invalidate_all(self):
+    # Every key includes the '*' namespace.
+    self.invalidate('*')
+
+  def key(self, namespaces, kwargs):
+    """Cache key of the current request's page, built from `namespaces` and the view arguments."""
+    versions = ','.join(
+      '{}={}'.format(name, self.version(name))
+      for name in ['*'] + [namespace.format(**kwargs) for namespace in namespaces]
+    )
+    return 'view:{}:{}'.format(request.full_path, versions)
+
+  def cached(self, *namespaces, timeout=None):
+    def decorator(view):
+      @wraps(view)
+      def wrapper(**kwargs):
+        # Pages carrying flashed messages are rendered for one visitor only.
+        if session.get('_flashes'):
+          return view(**kwargs)
+        key = self.key(namespaces, kwargs)
+        body = self.backend.get(key)
+        if body is None:
+          body = view(**kwargs)
+          # Only plain rendered pages are stored, not streams or redirects.
+          if isinstance(body, str):
+            self.backend.set(key, body, timeout)
+        return body
+      return wrapper
+    return decorator
+
+
+cache = ViewCache()
+
+
+def invalidate_from_command(*namespaces):
+  """Invalidate `namespaces`, or every page without any, from a CLI command.
+
+  The namespace versions are bumped in the shared backend, so the servers'
+  next requests rebuild their pages. The 'lru' cache has no shared store: the
+  servers keep their pages until they expire, and the command says so.
+  """
+  if namespaces:
+    cache.invalidate(*namespaces)
+  else:
+    cache.invalidate_all()
+  if not cache.shared:
+    click.echo('CACHE_TYPE is {}: running servers keep their cached pages for up to {}s.'.format(
+      current_app.config.get('CACHE_TYPE', 'lru'), current_app.config.get('CACHE_DEFAULT_TIMEOUT', 60)), err=True)
@@ -0,0 +1,150 @@
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+from flask import abort, current_app, g, request, stream_with_context, url_for
+import queries
+from conditional import validators
+from models import db
+
+#----------------------------------------------------------------------------#
+# Calendar feeds.
+#----------------------------------------------------------------------------#
+
+# /venues/<id>/calendar.ics and /artists/<id>/calendar.ics list the owner's
+# shows as iCalendar events, streamed as the rows are fetched. Their ETag and
+# Last-Modified come from one aggregate row (queries.calendar_state_query),
+# so polling an unchanged calendar is answered 304 without reading a show.
+#
+# Each response carries a Sync-Token header, the time of the latest change
+# of the calendar. Passing it back as ?since= returns only the shows changed
+# since then, and the shows deleted since then as cancelled events. Both
+# Show.updated_at and DeletedShow.deleted_at come from the database clock, so
+# the token compares against either the same way. Changes are looked up
+# CALENDAR_SYNC_OVERLAP seconds before the token as well, so a transaction
+# committing after a fetch that started later isn't missed; clients replace
+# events by UID (show-<id>@CALENDAR_UID_DOMAIN), so seeing one twice is
+# harmless. A calendar that hasn't changed keeps its token, so ?since= polls
+# are answered 304 too.
+
+# Token of a calendar without any change yet.
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_sync_token(changed_at):
+  return base64.urlsafe_b64encode(changed_at.isoformat().encode()).decode().rstrip('=')
+
+
+def decode_sync_token(token):
+  try:
+    changed_at = datetime.fromisoformat(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode())
+  except (binascii.Error, UnicodeDecodeError, ValueError):
+    abort(400)
+  # Tokens hold database times, which are naive, and none is before EPOCH.
+  if changed_at.tzinfo is not None or changed_at < EPOCH:
+    abort(400)
+  return changed_at
+
+
+def calendar_state(model, owner_fk, owner_id):
+  # Read once per request, by the validators and then by the view.
+  if 'calendar_state' not in g:
+    g.calendar_state = db.session.execute(queries.calendar_state_query(model, owner_fk, owner_id)).one()
+  return g.calendar_state
+
+
+def calendar_validators(model, owner_fk, owner_id):
+  return validators(calendar_state(model, owner_fk, owner_id))
+
+
+def ics_text(value):
+  return value.replace('\r', '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def ics_time(value):
+  # Show times are the venue's local time: "floating" in iCalendar terms.
+  return value.strftime('%Y%m%dT%H%M%S')
+
+
+def ics_utc(value):
+  return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def fold(line):
+  # Lines longer than 75 octets go on over lines starting with a space,
+  # without splitting a UTF-8 sequence.
+  data = line.encode('utf-8')
+  parts, start, width = [], 0, 75
+  while len(data) - start > width:
+    end = start + width
+    while data[end] & 0xC0 == 0x80:
+      end -= 1
+    parts.append(data[start:end])
+    start, width = end, 74
+  parts.append(data[start:])
+  return b'\r\n '.join(parts).decode('utf-8') + '\r\n'
+
+
+def content_lines(*lines):
+  return ''.join(fold(line) for line in lines)
+
+
+def event_uid(show_id):
+  # The same for a show whichever host name the feed was fetched from.
+  return 'show-{}@{}'.format(show_id, current_app.config['CALENDAR_UID_DOMAIN'])
+
+
+def show_event(show):
+  return content_lines(
+    'BEGIN:VEVENT',
+    'UID:' + event_uid(show.id),
+    'DTSTAMP:' + ics_utc(show.updated_at),
+    'LAST-MODIFIED:' + ics_utc(show.updated_at),
+    'DTSTART:' + ics_time(show.start_time),
+    'DTEND:' + ics_time(show.start_time + timedelta(minutes=show.duration_minutes)),
+    'SUMMARY:' + ics_text('{} at {}'.format(show.artist_name, show.venue_name)),
+    'LOCATION:' + ics_text(', '.join([show.venue_name, show.address, show.city, show.state])),
+    'URL:' + url_for('venues.show_venue', venue_id=show.venue_id, _external=True),
+    'END:VEVENT')
+
+
+def cancelled_event(deleted):
+  return content_lines(
+    'BEGIN:VEVENT',
+    'UID:' + event_uid(deleted.show_id),
+    'DTSTAMP:' + ics_utc(deleted.deleted_at),
+    'DTSTART:' + ics_time(deleted.start_time),
+    'STATUS:CANCELLED',
+    'END:VEVENT')
+
+
+def calendar_response(model, owner_fk, owner_id):
+  """The calendar of the venue or artist `owner_id`, or only its changes since ?since=."""
+  name, shows_changed_at, _, deleted_at = calendar_state(model, owner_fk, owner_id)
+  if name is None:
+    abort(404)
+  since = request.args.get('since')
+  changed_after = None
+  if since:
+    changed_after = decode_sync_token(since) - timedelta(seconds=current_app.config['CALENDAR_SYNC_OVERLAP'])
+
+  def generate():
+    yield content_lines(
+      'BEGIN:VCALENDAR',
+      'VERSION:2.0',
+      'PRODID:-//Fyyur//Shows//EN',
+      'CALSCALE:GREGORIAN',
+      'METHOD:PUBLISH',
+      'X-WR-CALNAME:' + ics_text('{} shows'.format(name)))
+    shows = db.session.execute(queries.calendar_shows_query(owner_fk, owner_id, changed_after)
+      .execution_options(yield_per=current_app.config['SHOWS_STREAM_BATCH_SIZE']))
+    for show in shows:
+      yield show_event(show)
+    if changed_after is not None:
+      for deleted in db.session.execute(queries.deleted_shows_query(owner_fk, owner_id, changed_after)):
+        yield cancelled_event(deleted)
+    yield content_lines('END:VCALENDAR')
+
+  response = current_app.response_class(stream_with_context(generate()), mimetype='text/calendar')
+  changed_at = max((value for value in (shows_changed_at, deleted_at) if value is not None), default=EPOCH)
+  response.headers['Sync-Token'] = encode_sync_token(changed_at)
+  return response
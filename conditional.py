@@ -0,0 +1,61 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import current_app, make_response, request, session
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+def validators(row):
+  """ETag and Last-Modified for a page, from a row of cheap aggregates.
+
+  The row holds whatever the page's content depends on, typically the latest
+  updated_at and the row counts of the tables it shows. The ETag is a digest
+  of all of it; Last-Modified is the latest timestamp in it.
+  """
+  etag = hashlib.md5(repr(tuple(row)).encode()).hexdigest()
+  last_modified = max((value for value in row if isinstance(value, datetime)), default=None)
+  if last_modified is not None:
+    # HTTP dates have whole seconds.
+    last_modified = last_modified.replace(microsecond=0)
+  return etag, last_modified
+
+
+def not_modified(etag, last_modified):
+  """Whether the request's If-None-Match or If-Modified-Since matches the page."""
+  if request.if_none_match:
+    return request.if_none_match.contains(etag)
+  return last_modified is not None and \
+    request.if_modified_since is not None and \
+    last_modified <= request.if_modified_since.replace(tzinfo=None)
+
+
+def add_validators(response, etag, last_modified):
+  response.set_etag(etag)
+  response.last_modified = last_modified
+  response.cache_control.no_cache = True
+  return response
+
+
+def conditional(get_validators):
+  """Answer 304 Not Modified without running the view when the client's copy is current.
+
+  `get_validators(**view_args)` returns the (etag, last_modified) pair of the
+  page, see `validators`. Responses carry both and ask clients to revalidate.
+  """
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+      # Flashed messages are not part of the validators.
+      if session.get('_flashes'):
+        return view(**kwargs)
+
+      etag, last_modified = get_validators(**kwargs)
+      if not_modified(etag, last_modified):
+        response = current_app.response_class(status=304)
+      else:
+        response = make_response(view(**kwargs))
+      return add_validators(response, etag, last_modified)
+    return wrapper
+  return decorator
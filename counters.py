@@ -0,0 +1,95 @@
+import time
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select, update
+from cache import invalidate_from_command
+from models import db, Venue, Artist, Show, upcoming_shows_watermark
+
+#----------------------------------------------------------------------------#
+# Upcoming show counters.
+#----------------------------------------------------------------------------#
+
+# Venue.upcoming_shows_count and Artist.upcoming_shows_count hold the number
+# of their shows starting after the watermark (upcoming_shows_watermark). The
+# database keeps them right as shows are inserted, moved or deleted (see the
+# migration adding them); as time passes, shows that started need to move
+# from upcoming to past, which is what the refresher below does. Run it every
+# minute or so:
+#
+#     flask refresh-upcoming-counts --every 60
+#
+# Listings and searches read the counters, so they lag by at most that
+# interval. The venue and artist pages count their shows exactly.
+
+OWNERS = ((Venue, Show.venue_id, 'venue:{}'), (Artist, Show.artist_id, 'artist:{}'))
+
+
+def lock_watermark():
+  # Writes to "Show" share-lock the watermark row in their triggers, so this
+  # waits for them and holds back new ones until the refresh commits.
+  return db.session.execute(
+    select(upcoming_shows_watermark.c.counted_at).with_for_update()).scalar()
+
+
+def refresh_upcoming_counts():
+  """Move the shows that started since the last refresh to past; return the namespaces that changed."""
+  watermark = lock_watermark()
+  now = datetime.now()
+  namespaces = []
+  for model, show_fk, namespace in OWNERS:
+    started = select(show_fk.label('id'), func.count(Show.id).label('n')) \
+      .where(Show.start_time > watermark, Show.start_time <= now) \
+      .group_by(show_fk) \
+      .subquery()
+    table = model.__table__
+    changed = db.session.execute(
+      update(table)
+        .where(table.c.id == started.c.id)
+        .values(upcoming_shows_count=table.c.upcoming_shows_count - started.c.n, updated_at=func.localtimestamp())
+        .returning(table.c.id)
+    )
+    namespaces += [namespace.format(id) for id, in changed]
+  db.session.execute(update(upcoming_shows_watermark).values(counted_at=now))
+  db.session.commit()
+  return namespaces
+
+
+def rebuild_upcoming_counts():
+  """Recount every venue's and artist's upcoming shows from scratch."""
+  lock_watermark()
+  now = datetime.now()
+  for model, show_fk, _ in OWNERS:
+    table = model.__table__
+    count = select(func.count(Show.id)) \
+      .where(show_fk == table.c.id, Show.start_time > now) \
+      .scalar_subquery()
+    db.session.execute(
+      update(table)
+        .where(table.c.upcoming_shows_count != count)
+        .values(upcoming_shows_count=count, updated_at=func.localtimestamp()))
+  db.session.execute(update(upcoming_shows_watermark).values(counted_at=now))
+  db.session.commit()
+
+
+@click.command('refresh-upcoming-counts')
+@click.option('--every', type=float, help='Keep running, refreshing every this many seconds.')
+@click.option('--rebuild', is_flag=True, help='Recount everything instead (repairs the counters).')
+@with_appcontext
+def refresh_upcoming_counts_command(every, rebuild):
+  """Move shows that have started from the upcoming to the past show counts."""
+  if rebuild:
+    rebuild_upcoming_counts()
+    invalidate_from_command()
+    click.echo('Rebuilt the upcoming show counts.')
+    return
+  while True:
+    started = time.perf_counter()
+    namespaces = refresh_upcoming_counts()
+    if namespaces:
+      invalidate_from_command('venues', 'artists', *namespaces)
+    click.echo('Refreshed {} upcoming show counts in {:.2f}s.'.format(
+      len(namespaces), time.perf_counter() - started))
+    if not every:
+      return
+    time.sleep(every)
@@ -1,9 +1,10 @@
 from datetime import datetime
 from flask_wtf import FlaskForm as Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField, TextAreaField
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange
 import re
 from enums import Genre, State
+from models import DEFAULT_SHOW_MINUTES
 
 
 
@@ -11,17 +12,35 @@ def is_valid_phone(number):
     regex = re.compile('^\(?([0-9]{3})\)?[-. ]?([0-9]{3})[-. ]?([0-9]{4})$')
     return regex.match(number)
 class ShowForm(Form):
-    artist_id = StringField(
-        'artist_id'
+    artist_id = IntegerField(
+        'artist_id', validators=[DataRequired()]
     )
-    venue_id = StringField(
-        'venue_id'
+    venue_id = IntegerField(
+        'venue_id', validators=[DataRequired()]
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
+        format=['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'],
         default= datetime.today()
     )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[DataRequired(), NumberRange(min=1, max=24 * 60)],
+        default=DEFAULT_SHOW_MINUTES
+    )
+
+class ShowBatchForm(Form):
+    # One show per line: artist ID, venue ID, start time and optionally the
+    # duration in minutes, separated by commas.
+    shows = TextAreaField(
+        'shows', validators=[DataRequired()]
+    )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[DataRequired(), NumberRange(min=1, max=24 * 60)],
+        default=DEFAULT_SHOW_MINUTES
+    )
 
 class VenueForm(Form):
     name = StringField(
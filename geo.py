@@ -0,0 +1,165 @@
+import csv
+import math
+import time
+from collections import namedtuple
+from functools import lru_cache
+import click
+from flask import abort, current_app, request
+from flask.cli import with_appcontext
+from sqlalchemy import Float, String, and_, column, func, select, update, values
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Venue locations.
+#----------------------------------------------------------------------------#
+
+# Venues carry the latitude and longitude of their city, looked up in the
+# gazetteer bundled with the app (GAZETTEER_PATH, a city,state,latitude,
+# longitude CSV) so geocoding needs no outside service. Venues are geocoded as
+# they are created or edited; `flask geocode-venues` fills in the rest, such
+# as imported venues.
+#
+# Nearby searches use PostgreSQL's earthdistance extension: the GiST index on
+# ll_to_earth(latitude, longitude) finds the venues inside the cube around a
+# circle (earth_box), and earth_distance trims them to the circle itself.
+
+EARTH_RADIUS_KM = 6371.0
+
+
+@lru_cache(maxsize=4)
+def read_gazetteer(path):
+  with open(path, newline='', encoding='utf-8') as f:
+    return {
+      (row['city'].strip().lower(), row['state'].strip().upper()): (float(row['latitude']), float(row['longitude']))
+      for row in csv.DictReader(f)
+    }
+
+
+def city_location(city, state):
+  """(latitude, longitude) of a city from the gazetteer, or None when it isn't listed."""
+  return read_gazetteer(current_app.config['GAZETTEER_PATH']).get(((city or '').strip().lower(), (state or '').upper()))
+
+
+def locate(venue):
+  venue.latitude, venue.longitude = city_location(venue.city, venue.state) or (None, None)
+
+
+def earth_point(latitude, longitude):
+  return func.ll_to_earth(latitude, longitude)
+
+
+# Same expression as the index on "Venue", so the planner can use it.
+VENUE_POINT = earth_point(Venue.latitude, Venue.longitude)
+
+
+def great_circle_km(latitude1, longitude1, latitude2, longitude2):
+  phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+  a = math.sin((phi2 - phi1) / 2) ** 2 + \
+    math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(longitude2 - longitude1) / 2) ** 2
+  return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# A nearby search: the venues it picks, the distance to order them by (None
+# for a box) and how the page describes it.
+Area = namedtuple('Area', 'condition distance description')
+
+
+def within_radius(latitude, longitude, radius_km):
+  center = earth_point(latitude, longitude)
+  meters = radius_km * 1000
+  return Area(
+    and_(func.earth_box(center, meters).op('@>')(VENUE_POINT), func.earth_distance(center, VENUE_POINT) <= meters),
+    func.earth_distance(center, VENUE_POINT) / 1000,
+    'within {:g} km of {:.4f}, {:.4f}'.format(radius_km, latitude, longitude))
+
+
+def within_box(south, west, north, east):
+  # The index is searched with the cube around the circle enclosing the box,
+  # then the venues are held to the box's bounds.
+  latitude, longitude = (south + north) / 2, (west + east) / 2
+  radius_km = max(great_circle_km(latitude, longitude, corner_latitude, corner_longitude)
+                  for corner_latitude in (south, north) for corner_longitude in (west, east))
+  return Area(
+    and_(
+      func.earth_box(earth_point(latitude, longitude), radius_km * 1000).op('@>')(VENUE_POINT),
+      Venue.latitude.between(south, north),
+      Venue.longitude.between(west, east)),
+    None,
+    'between {:.4f}, {:.4f} and {:.4f}, {:.4f}'.format(south, west, north, east))
+
+
+def requested_area():
+  """The Area of ?lat=&lng=[&radius=] (km) or ?bbox=south,west,north,east; None when neither is given."""
+  try:
+    if request.args.get('bbox'):
+      south, west, north, east = [float(value) for value in request.args['bbox'].split(',')]
+      if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValueError(request.args['bbox'])
+      return within_box(south, west, north, east)
+    if request.args.get('lat') and request.args.get('lng'):
+      latitude, longitude = float(request.args['lat']), float(request.args['lng'])
+      radius_km = request.args.get('radius', current_app.config['NEARBY_DEFAULT_RADIUS_KM'], type=float)
+      if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and radius_km > 0):
+        raise ValueError(request.args)
+      return within_radius(latitude, longitude, min(radius_km, current_app.config['NEARBY_MAX_RADIUS_KM']))
+  except ValueError:
+    abort(400)
+  return None
+
+
+def nearby_venues_query(area, limit):
+  # Closest first, or by name for a box.
+  distance = (area.distance if area.distance is not None else func.cast(None, Float)).label('distance_km')
+  query = select(Venue.id, Venue.name, Venue.city, Venue.state, Venue.address,
+                 Venue.upcoming_shows_count.label('num_upcoming_shows'), distance) \
+    .where(area.condition)
+  if area.distance is not None:
+    return query.order_by(area.distance).limit(limit)
+  return query.order_by(Venue.name).limit(limit)
+
+
+def nearby_shows_query(area, now, limit):
+  # The next upcoming shows at the venues of `area`, soonest first.
+  return select(
+      Show.id,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Show.artist_id,
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'),
+      Show.start_time
+    ).join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id) \
+    .where(area.condition, Show.start_time > now) \
+    .order_by(Show.start_time, Show.id) \
+    .limit(limit)
+
+
+def geocode_venues(everything=False):
+  """Set the coordinates of the venues without any (all of them if `everything`); return how many were set."""
+  places = read_gazetteer(current_app.config['GAZETTEER_PATH'])
+  gazetteer = values(
+    column('city', String), column('state', String), column('latitude', Float), column('longitude', Float),
+    name='gazetteer',
+  ).data([(city, state, latitude, longitude) for (city, state), (latitude, longitude) in places.items()])
+  statement = update(Venue) \
+    .where(func.lower(func.trim(Venue.city)) == gazetteer.c.city, func.upper(Venue.state) == gazetteer.c.state) \
+    .values(latitude=gazetteer.c.latitude, longitude=gazetteer.c.longitude) \
+    .execution_options(synchronize_session=False)
+  if not everything:
+    statement = statement.where(Venue.latitude.is_(None))
+  geocoded = db.session.execute(statement).rowcount
+  db.session.commit()
+  return geocoded
+
+
+@click.command('geocode-venues')
+@click.option('--all', 'everything', is_flag=True, help='Geocode every venue again, not only those without coordinates.')
+@with_appcontext
+def geocode_venues_command(everything):
+  """Set venue coordinates from the bundled gazetteer."""
+  started = time.perf_counter()
+  geocoded = geocode_venues(everything)
+  missing = db.session.query(func.count(Venue.id)).filter(Venue.latitude.is_(None)).scalar()
+  click.echo('Geocoded {} venues in {:.2f}s; {} venues are in cities missing from {}.'.format(
+    geocoded, time.perf_counter() - started, missing, current_app.config['GAZETTEER_PATH']))
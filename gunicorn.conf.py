@@ -0,0 +1,35 @@
+import gc
+import multiprocessing
+import os
+
+# gunicorn settings for serving Fyyur:
+#
+#     gunicorn --config gunicorn.conf.py
+#
+# The app is built once in the master process (preload_app) and the workers
+# are forked from it, so they start without importing anything and share the
+# master's memory until they write to it. create_app() opens no connection or
+# file, and forked workers drop any pooled connection they inherit.
+
+wsgi_app = 'app:create_app()'
+bind = os.environ.get('BIND', '0.0.0.0:{}'.format(os.environ.get('PORT', 8000)))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+if workers > 1:
+  # Pages cached by one worker must be invalidated by the writes of the
+  # others, so they share a Redis cache unless told otherwise (see config.py).
+  os.environ.setdefault('CACHE_TYPE', 'redis')
+
+
+def post_fork(server, worker):
+  # A worker drops the pooled connections the master may have opened while
+  # loading the app, instead of sharing their sockets with it.
+  from models import db
+  db.dispose_engines(server.app.wsgi())
+
+
+def when_ready(server):
+  # Keep the garbage collector of the workers away from the objects built so
+  # far; collecting them would write to, and so copy, the shared pages.
+  gc.freeze()
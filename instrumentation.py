@@ -0,0 +1,172 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Request instrumentation.
+#----------------------------------------------------------------------------#
+
+# Every request records its wall time, the number and total duration of the SQL
+# statements it executed and the time spent rendering templates. The numbers
+# go out in a Server-Timing header and into per-endpoint histograms served in
+# Prometheus text format at /metrics. Statements slower than
+# SLOW_QUERY_THRESHOLD_MS are logged with the endpoint that issued them.
+#
+# Streamed responses (/shows?stream=1, the calendar feeds) query and render as
+# their body is sent, after the headers: they are recorded once the body is
+# done, and carry no Server-Timing header.
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class EndpointMetrics(object):
+  def __init__(self):
+    self.buckets = [0] * (len(BUCKETS) + 1)
+    self.count = 0
+    self.duration = 0.0
+    self.sql_statements = 0
+    self.sql_duration = 0.0
+    self.render_duration = 0.0
+
+  def observe(self, timing, duration):
+    self.buckets[bisect_left(BUCKETS, duration)] += 1
+    self.count += 1
+    self.duration += duration
+    self.sql_statements += timing['sql_statements']
+    self.sql_duration += timing['sql_duration']
+    self.render_duration += timing['render_duration']
+
+
+def current_timing():
+  if has_request_context():
+    return g.get('_timing')
+  return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info['query_started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  duration = time.perf_counter() - conn.info.pop('query_started')
+  timing = current_timing()
+  if timing is None:
+    return
+  timing['sql_statements'] += 1
+  timing['sql_duration'] += duration
+  threshold = current_app.config.get('SLOW_QUERY_THRESHOLD_MS')
+  if threshold is not None and duration * 1000 >= threshold:
+    current_app.logger.warning('Slow query (%.1f ms) in %s %s [%s]: %s',
+      duration * 1000, request.method, request.path, request.endpoint, statement)
+
+
+class TimedTemplate(Template):
+  """Template that adds its render time to the current request's timing."""
+
+  def render(self, *args, **kwargs):
+    started = time.perf_counter()
+    try:
+      return super().render(*args, **kwargs)
+    finally:
+      timing = current_timing()
+      if timing is not None:
+        timing['render_duration'] += time.perf_counter() - started
+
+  def generate(self, *args, **kwargs):
+    # Timed chunk by chunk, leaving out the time the server spends sending
+    # them and the statements run to fetch the rows being rendered.
+    chunks = super().generate(*args, **kwargs)
+    while True:
+      timing = current_timing()
+      started = time.perf_counter()
+      sql_duration = timing['sql_duration'] if timing is not None else 0.0
+      try:
+        chunk = next(chunks)
+      except StopIteration:
+        return
+      finally:
+        if timing is not None:
+          timing['render_duration'] += time.perf_counter() - started - (timing['sql_duration'] - sql_duration)
+      yield chunk
+
+
+class Instrumentation(object):
+  def __init__(self, app=None):
+    self.metrics = {}
+    self._lock = threading.Lock()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(self.start_request)
+    app.after_request(self.finish_request)
+    app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+    app.extensions['instrumentation'] = self
+
+  def start_request(self):
+    g._timing = {
+      'started': time.perf_counter(),
+      'sql_statements': 0,
+      'sql_duration': 0.0,
+      'render_duration': 0.0,
+    }
+
+  def finish_request(self, response):
+    timing = g.get('_timing')
+    if timing is None:
+      return response
+    endpoint = request.endpoint or 'none'
+    if response.is_streamed:
+      # Still counting while the body is generated.
+      response.call_on_close(lambda: self.observe(endpoint, timing))
+      return response
+    del g._timing
+    duration = self.observe(endpoint, timing)
+    response.headers['Server-Timing'] = ', '.join([
+      'db;dur={:.1f};desc="{} queries"'.format(timing['sql_duration'] * 1000, timing['sql_statements']),
+      'render;dur={:.1f}'.format(timing['render_duration'] * 1000),
+      'total;dur={:.1f}'.format(duration * 1000),
+    ])
+    return response
+
+  def observe(self, endpoint, timing):
+    duration = time.perf_counter() - timing['started']
+    with self._lock:
+      self.metrics.setdefault(endpoint, EndpointMetrics()).observe(timing, duration)
+    return duration
+
+  def metrics_view(self):
+    lines = [
+      '# HELP fyyur_request_duration_seconds Request latency by endpoint.',
+      '# TYPE fyyur_request_duration_seconds histogram',
+    ]
+    with self._lock:
+      metrics = sorted(self.metrics.items())
+      for endpoint, m in metrics:
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), m.buckets):
+          cumulative += count
+          lines.append('fyyur_request_duration_seconds_bucket{{endpoint="{}",le="{}"}} {}'.format(
+            endpoint, bound, cumulative))
+        lines.append('fyyur_request_duration_seconds_sum{{endpoint="{}"}} {}'.format(endpoint, m.duration))
+        lines.append('fyyur_request_duration_seconds_count{{endpoint="{}"}} {}'.format(endpoint, m.count))
+      for name, attribute, help_text in (
+          ('fyyur_sql_statements_total', 'sql_statements', 'SQL statements executed, by endpoint.'),
+          ('fyyur_sql_duration_seconds_total', 'sql_duration', 'Time spent in SQL statements, by endpoint.'),
+          ('fyyur_render_duration_seconds_total', 'render_duration', 'Time spent rendering templates, by endpoint.')):
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} counter'.format(name))
+        for endpoint, m in metrics:
+          lines.append('{}{{endpoint="{}"}} {}'.format(name, endpoint, getattr(m, attribute)))
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,149 @@
+import random
+import signal
+import time
+import traceback
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from models import db, Venue, Artist, Job
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#----------------------------------------------------------------------------#
+
+# Work a write sets off but its visitor doesn't wait for, such as checking
+# image links. Handlers enqueue() jobs in the session of the write, so a job exists once the write commits and not at all
+# if it rolls back. Workers take due jobs off the "Job" table with
+# SELECT ... FOR UPDATE SKIP LOCKED, so any number of them can run side by
+# side without taking the same job:
+#
+#     flask work-jobs
+#
+# A job runs in a savepoint of the transaction holding its row lock: on
+# success its row is deleted in the same commit, on failure its writes are
+# rolled back and it is retried after an exponential backoff. Jobs run at
+# least once, so they are written to be safe to repeat.
+#
+# Whatever the pages must show right after the write (updated_at of the shows
+# of an edited venue or artist, cache invalidations) stays in the request: the
+# workers are other processes, whose invalidations don't reach the per-process
+# 'lru' cache of the servers.
+
+HANDLERS = {}
+
+OWNER_MODELS = {'venue': Venue, 'artist': Artist}
+
+
+def job(name):
+  """Register the decorated function as the handler of jobs called `name`.
+
+  It is called with the job's payload as keyword arguments.
+  """
+  def register(handler):
+    HANDLERS[name] = handler
+    return handler
+  return register
+
+
+def enqueue(name, **payload):
+  """Add a `name` job to the current session; it is queued when the session commits."""
+  db.session.add(Job(name=name, payload=payload))
+
+
+def retry_delay(attempts):
+  # Jittered so jobs that failed together don't all come back together.
+  delay = min(current_app.config['JOB_RETRY_DELAY'] * 2 ** (attempts - 1), current_app.config['JOB_RETRY_MAX_DELAY'])
+  return delay * random.uniform(0.5, 1)
+
+
+def claim_next():
+  return db.session.execute(
+    select(Job)
+      .where(Job.failed_at.is_(None), Job.run_at <= datetime.now())
+      .order_by(Job.run_at)
+      .limit(1)
+      .with_for_update(skip_locked=True)
+  ).scalar()
+
+
+def run_next():
+  """Run the next due job that no other worker holds; return False if there was none."""
+  job = claim_next()
+  if job is None:
+    db.session.rollback()
+    return False
+  try:
+    with db.session.begin_nested():
+      HANDLERS[job.name](**job.payload)
+    db.session.delete(job)
+  except Exception:
+    job.attempts += 1
+    job.last_error = traceback.format_exc()
+    if job.attempts >= current_app.config['JOB_MAX_ATTEMPTS']:
+      job.failed_at = datetime.now()
+      current_app.logger.error('Job %s (%s) failed %s times, giving up:\n%s',
+                               job.id, job.name, job.attempts, job.last_error)
+    else:
+      job.run_at = datetime.now() + timedelta(seconds=retry_delay(job.attempts))
+  db.session.commit()
+  return True
+
+
+@click.command('work-jobs')
+@click.option('--once', is_flag=True, help='Run the jobs due now and exit instead of waiting for more.')
+@click.option('--poll-interval', type=float, help='Seconds to wait when no job is due [default: JOB_POLL_INTERVAL].')
+@with_appcontext
+def work_jobs(once, poll_interval):
+  """Run background jobs as they come due."""
+  poll_interval = poll_interval or current_app.config['JOB_POLL_INTERVAL']
+  # Finish the running job on SIGTERM, then stop.
+  stopping = []
+  signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+  ran = 0
+  while not stopping:
+    if run_next():
+      ran += 1
+    elif once:
+      break
+    else:
+      time.sleep(poll_interval)
+  click.echo('Ran {} jobs.'.format(ran))
+
+#----------------------------------------------------------------------------#
+# Jobs.
+#----------------------------------------------------------------------------#
+
+class LinkUnreachable(Exception):
+  pass
+
+
+def link_status(url):
+  """HTTP status of a HEAD request to `url`; raises LinkUnreachable when it may be worth retrying."""
+  request = urllib.request.Request(url, method='HEAD', headers={'User-Agent': 'Fyyur link check'})
+  try:
+    with urllib.request.urlopen(request, timeout=current_app.config['JOB_HTTP_TIMEOUT']) as response:
+      return response.status
+  except urllib.error.HTTPError as e:
+    if e.code == 429 or e.code >= 500:
+      raise LinkUnreachable('{} answered {}'.format(url, e.code))
+    return e.code
+  except (urllib.error.URLError, OSError) as e:
+    raise LinkUnreachable('{}: {}'.format(url, e))
+
+
+@job('check_image_link')
+def check_image_link(kind, id):
+  # Logs the venues and artists whose image can't be displayed.
+  record = db.session.get(OWNER_MODELS[kind], id)
+  if record is None or not record.image_link:
+    return
+  if not record.image_link.startswith(('http://', 'https://')):
+    current_app.logger.warning('The image link of %s %s is not a web address: %s', kind, id, record.image_link)
+    return
+  status = link_status(record.image_link)
+  if status >= 400:
+    current_app.logger.warning('The image link of %s %s is broken (%s): %s', kind, id, status, record.image_link)
@@ -0,0 +1,31 @@
+"""venue locations
+
+Revision ID: 234f5c8cbb62
+Revises: 3afdc3d5a6b0
+Create Date: 2026-10-18 20:02:40.759228
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '234f5c8cbb62'
+down_revision = '3afdc3d5a6b0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ll_to_earth() and earth_box() come from earthdistance, built on cube.
+    op.execute('CREATE EXTENSION IF NOT EXISTS cube')
+    op.execute('CREATE EXTENSION IF NOT EXISTS earthdistance')
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.execute('CREATE INDEX "ix_Venue_location" ON "Venue" USING gist (ll_to_earth(latitude, longitude))')
+
+
+def downgrade():
+    op.drop_index('ix_Venue_location', table_name='Venue')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
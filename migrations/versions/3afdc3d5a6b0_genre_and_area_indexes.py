@@ -0,0 +1,28 @@
+"""genre and area indexes
+
+Revision ID: 3afdc3d5a6b0
+Revises: 918f866732ad
+Create Date: 2026-10-18 20:00:01.066532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3afdc3d5a6b0'
+down_revision = '918f866732ad'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.create_index('ix_{}_genres'.format(table), table, ['genres'], postgresql_using='gin')
+        op.create_index('ix_{}_state_city'.format(table), table, ['state', 'city'])
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.drop_index('ix_{}_state_city'.format(table), table_name=table)
+        op.drop_index('ix_{}_genres'.format(table), table_name=table)
@@ -0,0 +1,62 @@
+"""search vectors and trigram indexes
+
+Revision ID: 586870672c6f
+Revises: 6e76ade472f5
+Create Date: 2026-10-18 19:21:45.976280
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '586870672c6f'
+down_revision = '6e76ade472f5'
+branch_labels = None
+depends_on = None
+
+
+# Keeps search_vector in sync with the searchable columns of Venue and Artist.
+# Names weigh more than the location, which weighs more than the genres.
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_search_vector_update() RETURNS trigger AS $$
+BEGIN
+  NEW.search_vector :=
+    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(array_to_string(NEW.genres, ' '), '')), 'C');
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TABLES = ('Venue', 'Artist')
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(SEARCH_VECTOR_FUNCTION)
+    for table in TABLES:
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute(
+            'CREATE TRIGGER "{0}_search_vector_update" '
+            'BEFORE INSERT OR UPDATE OF name, city, state, genres ON "{0}" '
+            'FOR EACH ROW EXECUTE PROCEDURE fyyur_search_vector_update()'.format(table)
+        )
+        # Fire the trigger once for every existing row.
+        op.execute('UPDATE "{0}" SET name = name'.format(table))
+        op.create_index('ix_{}_search_vector'.format(table), table, ['search_vector'],
+                        unique=False, postgresql_using='gin')
+        op.create_index('ix_{}_name_trgm'.format(table), table, ['name'],
+                        unique=False, postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index('ix_{}_name_trgm'.format(table), table_name=table)
+        op.drop_index('ix_{}_search_vector'.format(table), table_name=table)
+        op.execute('DROP TRIGGER "{0}_search_vector_update" ON "{0}"'.format(table))
+        op.drop_column(table, 'search_vector')
+    op.execute('DROP FUNCTION fyyur_search_vector_update()')
@@ -0,0 +1,32 @@
+"""updated_at timestamps
+
+Revision ID: 5b5bd4141e4d
+Revises: 586870672c6f
+Create Date: 2026-10-18 19:23:45.150027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b5bd4141e4d'
+down_revision = '586870672c6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+        op.create_index('ix_{}_updated_at'.format(table), table, ['updated_at'], unique=False)
+    op.create_index('ix_Show_venue_id_updated_at', 'Show', ['venue_id', 'updated_at'], unique=False)
+    op.create_index('ix_Show_artist_id_updated_at', 'Show', ['artist_id', 'updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_artist_id_updated_at', table_name='Show')
+    op.drop_index('ix_Show_venue_id_updated_at', table_name='Show')
+    for table in ('Venue', 'Artist', 'Show'):
+        op.drop_index('ix_{}_updated_at'.format(table), table_name=table)
+        op.drop_column(table, 'updated_at')
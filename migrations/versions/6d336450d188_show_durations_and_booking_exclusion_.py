@@ -0,0 +1,41 @@
+"""show durations and booking exclusion constraints
+
+Revision ID: 6d336450d188
+Revises: 7c9e7dabe2bb
+Create Date: 2026-10-18 19:46:51.333730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d336450d188'
+down_revision = '7c9e7dabe2bb'
+branch_labels = None
+depends_on = None
+
+
+# One show at a time per venue and per artist. btree_gist lets the GiST
+# indexes behind the constraints hold the integer owner column next to the
+# show's time range. Existing overlapping shows make the upgrade fail with the
+# keys of the first pair found; move or delete one of each pair and run it again.
+PERIOD = "tsrange(start_time, start_time + duration_minutes * interval '1 minute')"
+
+OWNERS = ('venue_id', 'artist_id')
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('Show', sa.Column('duration_minutes', sa.Integer(), server_default='120', nullable=False))
+    for owner in OWNERS:
+        op.execute(
+            'ALTER TABLE "Show" ADD CONSTRAINT "Show_{0}_period_excl" '
+            'EXCLUDE USING gist ({0} WITH =, {1} WITH &&)'.format(owner, PERIOD)
+        )
+
+
+def downgrade():
+    for owner in OWNERS:
+        op.drop_constraint('Show_{}_period_excl'.format(owner), 'Show')
+    op.drop_column('Show', 'duration_minutes')
@@ -0,0 +1,24 @@
+"""show feed index
+
+Revision ID: 6e76ade472f5
+Revises: 1ebea3c56fd2
+Create Date: 2026-10-18 19:21:14.503933
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e76ade472f5'
+down_revision = '1ebea3c56fd2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
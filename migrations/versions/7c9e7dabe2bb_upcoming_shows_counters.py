@@ -0,0 +1,83 @@
+"""upcoming shows counters
+
+Revision ID: 7c9e7dabe2bb
+Revises: 5b5bd4141e4d
+Create Date: 2026-10-18 19:36:35.726400
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c9e7dabe2bb'
+down_revision = '5b5bd4141e4d'
+branch_labels = None
+depends_on = None
+
+
+# Venue and Artist count their shows starting after the watermark in
+# upcoming_shows_watermark. These statement-level triggers apply the changes of
+# each INSERT, UPDATE or DELETE on "Show" to the counters, one grouped UPDATE
+# per table, and bump updated_at of the rows whose count changed. The
+# watermark row is share-locked so that `flask refresh-upcoming-counts`, which
+# moves it forward, waits for writes in progress (see counters.py).
+COUNTER_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_upcoming_shows_count_update() RETURNS trigger AS $$
+DECLARE
+  watermark timestamp;
+  changes text;
+  target record;
+BEGIN
+  SELECT counted_at INTO watermark FROM upcoming_shows_watermark FOR SHARE;
+  changes := CASE TG_OP
+    WHEN 'INSERT' THEN 'SELECT venue_id, artist_id, 1 AS n FROM new_shows WHERE start_time > $1'
+    WHEN 'DELETE' THEN 'SELECT venue_id, artist_id, -1 AS n FROM old_shows WHERE start_time > $1'
+    ELSE 'SELECT venue_id, artist_id, 1 AS n FROM new_shows WHERE start_time > $1 '
+         'UNION ALL SELECT venue_id, artist_id, -1 FROM old_shows WHERE start_time > $1'
+  END;
+  FOR target IN SELECT * FROM (VALUES ('Venue', 'venue_id'), ('Artist', 'artist_id')) AS t(tbl, fk) LOOP
+    EXECUTE format(
+      'UPDATE %I t SET upcoming_shows_count = t.upcoming_shows_count + d.n, updated_at = localtimestamp '
+      'FROM (SELECT %I AS id, sum(n) AS n FROM (%s) c GROUP BY 1) d '
+      'WHERE t.id = d.id AND d.n <> 0', target.tbl, target.fk, changes)
+    USING watermark;
+  END LOOP;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TRIGGERS = {
+    # trigger name: (event, transition tables)
+    'Show_upcoming_count_insert': ('INSERT', 'NEW TABLE AS new_shows'),
+    'Show_upcoming_count_update': ('UPDATE', 'OLD TABLE AS old_shows NEW TABLE AS new_shows'),
+    'Show_upcoming_count_delete': ('DELETE', 'OLD TABLE AS old_shows'),
+}
+
+
+def upgrade():
+    op.create_table('upcoming_shows_watermark',
+        sa.Column('counted_at', sa.DateTime(), nullable=False))
+    op.execute('INSERT INTO upcoming_shows_watermark (counted_at) VALUES (localtimestamp)')
+    for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.execute(
+            'UPDATE "{0}" t SET upcoming_shows_count = ('
+            'SELECT count(*) FROM "Show" s WHERE s.{1} = t.id '
+            'AND s.start_time > (SELECT counted_at FROM upcoming_shows_watermark))'.format(table, fk))
+    op.execute(COUNTER_FUNCTION)
+    for name, (event, transition) in TRIGGERS.items():
+        op.execute(
+            'CREATE TRIGGER "{}" AFTER {} ON "Show" REFERENCING {} '
+            'FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_upcoming_shows_count_update()'.format(
+                name, event, transition))
+
+
+def downgrade():
+    for name in TRIGGERS:
+        op.execute('DROP TRIGGER "{}" ON "Show"'.format(name))
+    op.execute('DROP FUNCTION fyyur_upcoming_shows_count_update()')
+    for table in ('Venue', 'Artist'):
+        op.drop_column(table, 'upcoming_shows_count')
+    op.drop_table('upcoming_shows_watermark')
@@ -0,0 +1,36 @@
+"""background jobs
+
+Revision ID: 918f866732ad
+Revises: 6d336450d188
+Create Date: 2026-10-18 19:53:30.248264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '918f866732ad'
+down_revision = '6d336450d188'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), server_default='{}', nullable=False),
+        sa.Column('run_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('failed_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_Job_run_at', 'Job', ['run_at'], postgresql_where=sa.text('failed_at IS NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_Job_run_at', table_name='Job')
+    op.drop_table('Job')
@@ -0,0 +1,54 @@
+"""deleted shows
+
+Revision ID: fcb6b6c85edd
+Revises: 234f5c8cbb62
+Create Date: 2026-10-18 20:15:48.779300
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fcb6b6c85edd'
+down_revision = '234f5c8cbb62'
+branch_labels = None
+depends_on = None
+
+
+# Records every deleted show in "DeletedShow", one INSERT per DELETE
+# statement, including the shows deleted with their venue or artist.
+DELETION_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_record_deleted_shows() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO "DeletedShow" (show_id, venue_id, artist_id, start_time, deleted_at)
+  SELECT id, venue_id, artist_id, start_time, localtimestamp FROM old_shows
+  ON CONFLICT (show_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade():
+    op.create_table('DeletedShow',
+        sa.Column('show_id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), server_default=sa.text('localtimestamp'), nullable=False),
+        sa.PrimaryKeyConstraint('show_id'))
+    op.create_index('ix_DeletedShow_venue_id_deleted_at', 'DeletedShow', ['venue_id', 'deleted_at'])
+    op.create_index('ix_DeletedShow_artist_id_deleted_at', 'DeletedShow', ['artist_id', 'deleted_at'])
+    op.execute(DELETION_FUNCTION)
+    op.execute(
+        'CREATE TRIGGER "Show_record_deletions" AFTER DELETE ON "Show" REFERENCING OLD TABLE AS old_shows '
+        'FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_record_deleted_shows()')
+
+
+def downgrade():
+    op.execute('DROP TRIGGER "Show_record_deletions" ON "Show"')
+    op.execute('DROP FUNCTION fyyur_record_deleted_shows()')
+    op.drop_index('ix_DeletedShow_artist_id_deleted_at', table_name='DeletedShow')
+    op.drop_index('ix_DeletedShow_venue_id_deleted_at', table_name='DeletedShow')
+    op.drop_table('DeletedShow')
@@ -1,16 +1,31 @@
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, ExcludeConstraint
+from routing import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+# Sends the reads of GET requests to the read replicas, if any (see routing.py).
+db = RoutingSQLAlchemy()
 
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+# Length of a show unless told otherwise.
+DEFAULT_SHOW_MINUTES = 120
+
+def show_period(start_time, duration_minutes):
+  # The time a show occupies, [start_time, start_time + duration), as a tsrange.
+  return db.func.tsrange(start_time, start_time + duration_minutes * db.literal_column("interval '1 minute'"))
+
 # Show Model (Association table for the many to many relationship)
 # The need for a separate id column for shows only come because if we use the venue_id and the artist_id as the primary keys,
 # it will restrict one artist to have only one show at a particular venue. trying to add a show at a different time for the same
 # artist at the same venue will cause an error.
+# Relationships are never loaded implicitly: reading venue.shows or artist.shows
+# without a loader raises, so a new N+1 fails loudly (tests/test_query_counts.py
+# counts the statements of each route). Each view of the venues, artists and
+# shows blueprints picks the loader it needs (noload on edit forms, plain
+# column queries or SQL aggregates elsewhere).
 class Show(db.Model):
   __tablename__ = "Show"
   
@@ -18,6 +33,31 @@ class Show(db.Model):
   venue_id= db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete="CASCADE"), nullable=False)
   artist_id= db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete="CASCADE"), nullable=False)
   start_time= db.Column(db.DateTime, nullable=False)
+  duration_minutes = db.Column(db.Integer, nullable=False,
+    default=DEFAULT_SHOW_MINUTES, server_default=str(DEFAULT_SHOW_MINUTES))
+  # Also bumped when the show's venue or artist is edited, since their names and
+  # images are part of how a show is displayed. Taken from the database clock,
+  # like DeletedShow.deleted_at, since calendar sync tokens compare the two.
+  updated_at = db.Column(db.DateTime, nullable=False, index=True,
+    default=db.func.localtimestamp(), onupdate=db.func.localtimestamp(), server_default=db.func.now())
+
+  # The venue and artist pages read shows per owner in start_time order, and
+  # the /shows feed pages through all shows by (start_time, id). The
+  # (owner, updated_at) indexes serve the pages' ETag validators. A venue
+  # hosts, and an artist plays, one show at a time: the exclusion constraints
+  # reject overlapping shows, and their GiST indexes answer the overlap
+  # checks of scheduling.py.
+  __table_args__ = (
+    ExcludeConstraint((venue_id, '='), (show_period(start_time, duration_minutes), '&&'),
+                      name='Show_venue_id_period_excl', using='gist'),
+    ExcludeConstraint((artist_id, '='), (show_period(start_time, duration_minutes), '&&'),
+                      name='Show_artist_id_period_excl', using='gist'),
+    db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    db.Index('ix_Show_venue_id_updated_at', 'venue_id', 'updated_at'),
+    db.Index('ix_Show_artist_id_updated_at', 'artist_id', 'updated_at'),
+  )
   
 class Venue(db.Model):
     __tablename__ = "Venue"
@@ -34,7 +74,29 @@ class Venue(db.Model):
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String())
-    shows = db.relationship("Show", backref="venue", cascade="all, delete", lazy='joined')
+    # Of the venue's city, from the bundled gazetteer (see geo.py); None until
+    # geocoded or when the city isn't listed
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+        default=db.func.localtimestamp(), onupdate=db.func.localtimestamp(), server_default=db.func.now())
+    shows = db.relationship("Show", backref="venue", cascade="all, delete", lazy='raise')
+    # Shows starting after upcoming_shows_watermark.counted_at; maintained by
+    # database triggers on "Show" and `flask refresh-upcoming-counts` (see counters.py)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Filled by a database trigger from name, city, state and genres (see search.py)
+    search_vector = db.deferred(db.Column(TSVECTOR))
+
+    __table_args__ = (
+        db.Index('ix_Venue_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        # Genre, state and city filters of the listings (see queries.catalog_conditions).
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Venue_state_city', 'state', 'city'),
+        # Nearby searches (see geo.py); needs the earthdistance extension.
+        db.Index('ix_Venue_location', db.func.ll_to_earth(latitude, longitude), postgresql_using='gist'),
+    )
 
 
 class Artist(db.Model):
@@ -51,4 +113,64 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120))
     seeking_venues = db.Column(db.Boolean)
     seeking_description = db.Column(db.String())
-    shows = db.relationship("Show", backref="artist", cascade="all, delete", lazy='joined')
\ No newline at end of file
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+        default=db.func.localtimestamp(), onupdate=db.func.localtimestamp(), server_default=db.func.now())
+    shows = db.relationship("Show", backref="artist", cascade="all, delete", lazy='raise')
+    # Shows starting after upcoming_shows_watermark.counted_at; maintained by
+    # database triggers on "Show" and `flask refresh-upcoming-counts` (see counters.py)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Filled by a database trigger from name, city, state and genres (see search.py)
+    search_vector = db.deferred(db.Column(TSVECTOR))
+
+    __table_args__ = (
+        db.Index('ix_Artist_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        # Genre, state and city filters of the listings (see queries.catalog_conditions).
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Artist_state_city', 'state', 'city'),
+    )
+
+
+# Single row: the time up to which shows have been moved from upcoming to past
+# in the upcoming_shows_count columns (see counters.py).
+upcoming_shows_watermark = db.Table('upcoming_shows_watermark',
+    db.Column('counted_at', db.DateTime, nullable=False))
+
+
+# Background jobs waiting to run (see jobs.py). A job that failed
+# JOB_MAX_ATTEMPTS times is kept, with failed_at set, for someone to look at.
+class Job(db.Model):
+    __tablename__ = 'Job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    payload = db.Column(JSONB, nullable=False, default=dict, server_default='{}')
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.now, server_default=db.func.now())
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_error = db.Column(db.Text)
+    failed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now, server_default=db.func.now())
+
+    __table_args__ = (
+        # Workers take the due jobs in run_at order.
+        db.Index('ix_Job_run_at', 'run_at', postgresql_where=db.text('failed_at IS NULL')),
+    )
+
+
+class DeletedShow(db.Model):
+    __tablename__ = 'DeletedShow'
+
+    # Filled by a database trigger as shows are deleted, so the calendar feeds
+    # can tell their subscribers (see calendars.py). No foreign keys: the
+    # venue or artist may be gone too.
+    show_id = db.Column(db.Integer, primary_key=True)
+    venue_id = db.Column(db.Integer, nullable=False)
+    artist_id = db.Column(db.Integer, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, server_default=db.func.localtimestamp())
+
+    __table_args__ = (
+        db.Index('ix_DeletedShow_venue_id_deleted_at', 'venue_id', 'deleted_at'),
+        db.Index('ix_DeletedShow_artist_id_deleted_at', 'artist_id', 'deleted_at'),
+    )
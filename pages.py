@@ -0,0 +1,217 @@
+from collections import namedtuple
+from datetime import datetime
+from itertools import groupby
+from flask import abort, current_app, request, url_for
+import queries
+from conditional import validators
+from enums import Genre
+from models import db, Show
+
+# Helpers shared by the page views (venues.py, artists.py, shows.py) and the
+# async views in asgi.py.
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# The statements themselves live in queries.py.
+
+def split_shows(owner_fk, owner_id, counterpart, counterpart_fk, page=1):
+  # Past and upcoming shows of one venue or artist (owner_fk is Show.venue_id or
+  # Show.artist_id), each joined to the venue/artist on the other side.
+  # Both lists are bounded to SHOWS_PER_PAGE; past shows are paginated, newest first.
+  now = datetime.now()
+  per_page = current_app.config['SHOWS_PER_PAGE']
+  past_count, upcoming_count = db.session.execute(
+    queries.show_counts_query(owner_fk, owner_id, now)).one()
+  upcoming = db.session.execute(queries.owner_shows_query(
+    owner_fk, owner_id, counterpart, counterpart_fk, now, True, 1, per_page)).all()
+  past = db.session.execute(queries.owner_shows_query(
+    owner_fk, owner_id, counterpart, counterpart_fk, now, False, page, per_page)).all()
+  return past, upcoming, past_count, upcoming_count
+
+def show_cursor(show):
+  # Position of a show in the /shows feed, as passed back in ?after=.
+  return '{}_{}'.format(show.start_time.isoformat(), show.id)
+
+def parse_show_cursor(cursor):
+  try:
+    start_time, show_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(start_time), int(show_id)
+  except ValueError:
+    abort(400)
+
+#----------------------------------------------------------------------------#
+# Page data.
+#----------------------------------------------------------------------------#
+
+# Turn query rows into what the templates expect.
+
+def venue_areas(rows):
+  # The rows come back sorted by (state, city) and are bucketed into areas in a single pass.
+  areas = []
+  for (city, state), area_venues in groupby(rows, key=lambda row: (row.city, row.state)):
+    areas.append({
+      'city': city,
+      'state': state,
+      'venues': [{
+        'id': venue.id,
+        'name': venue.name,
+        'num_coming_shows': venue.num_upcoming_shows
+      } for venue in area_venues]
+    })
+  return areas
+
+# Filters of the venue and artist listings and searches: ?genre= (any
+# number of Genre names, all of which must match), ?state= and ?city=.
+CatalogFilters = namedtuple('CatalogFilters', 'genres city state')
+
+FACET_TITLES = (('genre', 'Genres'), ('state', 'States'), ('city', 'Cities'))
+
+def catalog_filters():
+  genres = sorted({name for name in request.values.getlist('genre') if name in Genre.__members__})
+  return CatalogFilters(genres, request.values.get('city') or None, request.values.get('state') or None)
+
+def catalog_url(filters, **params):
+  # The current page with other filters; `params` (the search term) are kept as they are.
+  return url_for(request.endpoint, genre=filters.genres, city=filters.city, state=filters.state, **params)
+
+def catalog_facets(rows, filters, **params):
+  # The facet_counts_query rows as, for each facet, its values with their
+  # counts and the link selecting or unselecting them.
+  facets = {facet: [] for facet, _ in FACET_TITLES}
+  for row in rows:
+    if row.facet == 'genre':
+      selected = row.value in filters.genres
+      genres = sorted(set(filters.genres) ^ {row.value})
+      toggled = filters._replace(genres=genres)
+      label = Genre[row.value].value if row.value in Genre.__members__ else row.value
+    elif row.facet == 'state':
+      selected = row.value == filters.state
+      toggled = filters._replace(city=None, state=None if selected else row.value)
+      label = row.value
+    else:
+      selected = row.value == filters.city and row.state == filters.state
+      toggled = filters._replace(city=None) if selected else filters._replace(city=row.value, state=row.state)
+      label = '{}, {}'.format(row.value, row.state)
+    facets[row.facet].append({
+      'label': label,
+      'count': row.count,
+      'selected': selected,
+      'url': catalog_url(toggled, **params),
+    })
+  return {
+    'filtered': any(filters),
+    'clear_url': catalog_url(CatalogFilters([], None, None), **params),
+    'facets': [
+      {'title': title, 'options': sorted(facets[facet], key=lambda option: (-option['count'], option['label']))}
+      for facet, title in FACET_TITLES if facets[facet]
+    ],
+  }
+
+def search_results(rows):
+  return {
+    "count": len(rows),
+    "data": [{
+      "id": row.id,
+      "name": row.name,
+      "num_upcoming_shows": row.num_upcoming_shows,
+    } for row in rows]
+  }
+
+def venue_page(venue, shows, page):
+  # `shows` is what split_shows returns.
+  past, upcoming, past_count, upcoming_count = shows
+
+  def temp_show(show):
+    return {
+      "artist_id": show.id,
+      "artist_name": show.name,
+      "artist_image_link": show.image_link,
+      "start_time": show.start_time
+    }
+
+  data = vars(venue)
+  data['past_shows'] = [temp_show(show) for show in past]
+  data['upcoming_shows'] = [temp_show(show) for show in upcoming]
+  data['past_shows_count'] = past_count
+  data['upcoming_shows_count'] = upcoming_count
+  data['past_shows_page'] = page
+  data['past_shows_pages'] = -(-past_count // current_app.config['SHOWS_PER_PAGE'])
+  return data
+
+def artist_page(artist, shows, page):
+  past, upcoming, past_count, upcoming_count = shows
+
+  def temp_show(show):
+    return {
+      "venue_id": show.id,
+      "venue_name": show.name,
+      "venue_image_link": show.image_link,
+      "start_time": show.start_time
+    }
+
+  data = vars(artist)
+  data['past_shows'] = [temp_show(show) for show in past]
+  data['upcoming_shows'] = [temp_show(show) for show in upcoming]
+  data['past_shows_count'] = past_count
+  data['upcoming_shows_count'] = upcoming_count
+  data['past_shows_page'] = page
+  data['past_shows_pages'] = -(-past_count // current_app.config['SHOWS_PER_PAGE'])
+  return data
+
+def feed_page(rows):
+  # `rows` holds up to SHOWS_PER_PAGE + 1 shows of the /shows feed; the extra
+  # one only tells that there is a next page.
+  per_page = current_app.config['SHOWS_PER_PAGE']
+  if len(rows) > per_page:
+    rows = rows[:per_page]
+    return rows, show_cursor(rows[-1])
+  return rows, None
+
+#----------------------------------------------------------------------------#
+# Cache invalidation.
+#----------------------------------------------------------------------------#
+
+# Cached pages are grouped in namespaces: 'venues', 'artists' and 'shows' for
+# the listings, 'venue:<id>' and 'artist:<id>' for the detail pages. A write
+# collects the namespaces it affects before committing and invalidates them
+# once the commit succeeded.
+
+def venue_namespaces(venue_id):
+  # A venue's name and image also appear on the pages of the artists who play there.
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  return ['venues', 'shows', 'venue:{}'.format(venue_id)] + \
+    ['artist:{}'.format(artist_id) for artist_id, in artist_ids]
+
+def artist_namespaces(artist_id):
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  return ['artists', 'shows', 'artist:{}'.format(artist_id)] + \
+    ['venue:{}'.format(venue_id) for venue_id, in venue_ids]
+
+def show_namespaces(bookings):
+  # New shows change the listings' upcoming counts and their venues' and artists' pages.
+  return ['venues', 'artists', 'shows'] + \
+    sorted({'venue:{}'.format(booking.venue_id) for booking in bookings}) + \
+    sorted({'artist:{}'.format(booking.artist_id) for booking in bookings})
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+# Aggregates each page's ETag and Last-Modified are computed from, answered
+# from the updated_at indexes. Editing a venue or artist also bumps the
+# updated_at of its shows, so pages listing shows only need to look at Show.
+# Detail pages also include their latest past start_time, which changes when
+# an upcoming show becomes a past one.
+
+def listing_validators(model):
+  return validators(db.session.execute(queries.listing_validators_query(model)).one())
+
+def detail_validators(model, owner_fk, owner_id):
+  return validators(db.session.execute(
+    queries.detail_validators_query(model, owner_fk, owner_id, datetime.now())).one())
+
+def touch_shows(owner_fk, owner_id):
+  Show.query.filter(owner_fk == owner_id) \
+    .update({Show.updated_at: db.func.localtimestamp()}, synchronize_session=False)
@@ -0,0 +1,161 @@
+from sqlalchemy import func, literal, null, select, true, tuple_, union_all
+from sqlalchemy.dialects.postgresql import array
+from models import Venue, Artist, Show, DeletedShow
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# Statements behind the read pages. Each function builds a select() that the
+# Flask views of the blueprints (venues.py, artists.py, shows.py) run on
+# db.session and the async views in asgi.py run on an AsyncSession, so both
+# serving modes issue the same SQL.
+
+def venue_areas_query(conditions=()):
+  # Every venue (matching `conditions`) ordered by area, with its precomputed
+  # upcoming show count (see counters.py), so no Show rows are read.
+  return select(
+      Venue.id,
+      Venue.name,
+      Venue.city,
+      Venue.state,
+      Venue.upcoming_shows_count.label('num_upcoming_shows')
+    ).where(*conditions) \
+    .order_by(Venue.state, Venue.city, Venue.name)
+
+def artist_list_query(conditions=()):
+  return select(Artist.id, Artist.name).where(*conditions)
+
+def catalog_conditions(model, filters):
+  # Where clauses picking the venues or artists with all the genres, and the
+  # city and state, of `filters` (pages.CatalogFilters). Genres are matched by
+  # array containment, answered from the GIN index on genres.
+  conditions = []
+  if filters.genres:
+    conditions.append(model.genres.op('@>')(array(filters.genres)))
+  if filters.state:
+    conditions.append(model.state == filters.state)
+  if filters.city:
+    conditions.append(model.city == filters.city)
+  return conditions
+
+def facet_counts_query(model, conditions, limit):
+  # (facet, value, state, count) rows: how many venues or artists matching
+  # `conditions` there are per genre, per state and per city (with its state),
+  # the `limit` largest of each. The matches are read once, into a CTE, and
+  # counted three ways in the same statement.
+  matches = select(model.city, model.state, model.genres).where(*conditions).cte('matches')
+  genre = func.unnest(matches.c.genres).table_valued('value').alias('genre')
+  count = func.count().label('count')
+  counts = [
+    select(literal('genre').label('facet'), genre.c.value, null().label('state'), count)
+      .select_from(matches).join(genre, true())
+      .group_by(genre.c.value),
+    select(literal('state').label('facet'), matches.c.state.label('value'), null().label('state'), count)
+      .group_by(matches.c.state),
+    select(literal('city').label('facet'), matches.c.city.label('value'), matches.c.state, count)
+      .group_by(matches.c.city, matches.c.state),
+  ]
+  return union_all(*[
+    select(query.order_by(count.desc()).limit(limit).subquery()) for query in counts
+  ])
+
+def show_counts_query(owner_fk, owner_id, now):
+  # (past, upcoming) show counts of one venue or artist; owner_fk is
+  # Show.venue_id or Show.artist_id.
+  return select(
+      func.count(Show.id).filter(Show.start_time <= now),
+      func.count(Show.id).filter(Show.start_time > now)
+    ).where(owner_fk == owner_id)
+
+def owner_shows_query(owner_fk, owner_id, counterpart, counterpart_fk, now, upcoming, page, per_page):
+  # One page of a venue's or artist's upcoming (soonest first) or past (newest
+  # first) shows, joined to the venue/artist on the other side. Read in
+  # start_time order straight off the (owner, start_time) index.
+  query = select(
+      counterpart.id,
+      counterpart.name,
+      counterpart.image_link,
+      Show.start_time
+    ).join(counterpart, counterpart.id == counterpart_fk) \
+    .where(owner_fk == owner_id)
+  if upcoming:
+    query = query.where(Show.start_time > now).order_by(Show.start_time)
+  else:
+    query = query.where(Show.start_time <= now).order_by(Show.start_time.desc())
+  return query.offset((max(page, 1) - 1) * per_page).limit(per_page)
+
+def show_feed_query(after=None):
+  # All shows ordered by (start_time, id), starting after the (start_time, id)
+  # position `after` when given.
+  query = select(
+      Show.id,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Show.artist_id,
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'),
+      Show.start_time
+    ).join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id) \
+    .order_by(Show.start_time, Show.id)
+  if after is not None:
+    query = query.where(tuple_(Show.start_time, Show.id) > tuple_(*after))
+  return query
+
+def listing_validators_query(model):
+  return select(func.max(model.updated_at), func.count(model.id))
+
+def detail_validators_query(model, owner_fk, owner_id, now):
+  updated_at = select(model.updated_at).where(model.id == owner_id).scalar_subquery()
+  return select(
+      updated_at,
+      func.max(Show.updated_at),
+      func.count(Show.id),
+      func.max(Show.start_time).filter(Show.start_time <= now)
+    ).where(owner_fk == owner_id)
+
+def calendar_state_query(model, owner_fk, owner_id):
+  # What a venue's or artist's calendar depends on, from the (owner,
+  # updated_at) and (owner, deleted_at) indexes: the owner's name (None when
+  # there is no such owner), its shows' latest change and count, and its
+  # latest deleted show.
+  deleted_fk = getattr(DeletedShow, owner_fk.key)
+  return select(
+      select(model.name).where(model.id == owner_id).scalar_subquery(),
+      func.max(Show.updated_at),
+      func.count(Show.id),
+      select(func.max(DeletedShow.deleted_at)).where(deleted_fk == owner_id).scalar_subquery()
+    ).where(owner_fk == owner_id)
+
+def database_time(column):
+  # A timestamp of the database clock (localtimestamp), in the database's
+  # time zone, as an aware datetime.
+  return func.timezone(func.current_setting('TimeZone'), column)
+
+def calendar_shows_query(owner_fk, owner_id, changed_after=None):
+  # The owner's shows, or those changed after `changed_after`, as calendar events.
+  query = select(
+      Show.id,
+      Show.start_time,
+      Show.duration_minutes,
+      database_time(Show.updated_at).label('updated_at'),
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Venue.address,
+      Venue.city,
+      Venue.state,
+      Show.artist_id,
+      Artist.name.label('artist_name')
+    ).join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id) \
+    .where(owner_fk == owner_id)
+  if changed_after is not None:
+    query = query.where(Show.updated_at > changed_after)
+  return query.order_by(Show.start_time, Show.id)
+
+def deleted_shows_query(owner_fk, owner_id, deleted_after):
+  deleted_fk = getattr(DeletedShow, owner_fk.key)
+  return select(DeletedShow.show_id, DeletedShow.start_time, database_time(DeletedShow.deleted_at).label('deleted_at')) \
+    .where(deleted_fk == owner_id, DeletedShow.deleted_at > deleted_after) \
+    .order_by(DeletedShow.show_id)
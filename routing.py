@@ -0,0 +1,137 @@
+import itertools
+import threading
+import time
+from flask import has_request_context, request, session as flask_session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.dml import UpdateBase
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+# With SQLALCHEMY_REPLICA_URIS set, the session sends the queries of GET and
+# HEAD requests to the replicas, taking them in turn, and everything else
+# (POST/DELETE handlers, flushes and INSERT/UPDATE/DELETE statements, CLI
+# commands) to the primary. Each replica is a Flask-SQLAlchemy bind
+# ('replica0', 'replica1', ...), so it gets the same engine options as the
+# primary. A replica that fails its periodic health check or drops a
+# connection is skipped until it passes again; with no healthy replica, reads
+# go to the primary. After a visitor writes, their own reads stay on the
+# primary for SQLALCHEMY_REPLICA_STICKY_SECONDS so they see the change
+# despite replication lag.
+
+class Replica(object):
+  def __init__(self, bind_key):
+    self.bind_key = bind_key
+    self.engine = None
+    self.healthy = True
+    self.checked_at = None
+
+
+class ReplicaSet(object):
+  """The replicas of one app, chosen round-robin among the healthy ones."""
+
+  def __init__(self, db, app, bind_keys, check_interval):
+    self.db = db
+    self.app = app
+    self.replicas = [Replica(bind_key) for bind_key in bind_keys]
+    self.check_interval = check_interval
+    self._turns = itertools.count()
+    self._lock = threading.Lock()
+
+  def engine(self, replica):
+    engine = self.db.get_engine(self.app, bind=replica.bind_key)
+    with self._lock:
+      if replica.engine is not engine:
+        replica.engine = engine
+
+        @event.listens_for(engine, 'handle_error')
+        def mark_unhealthy(context):
+          if context.is_disconnect:
+            replica.healthy = False
+            replica.checked_at = time.monotonic()
+    return engine
+
+  def is_healthy(self, replica):
+    now = time.monotonic()
+    if replica.checked_at is None or now - replica.checked_at >= self.check_interval:
+      replica.checked_at = now
+      try:
+        with self.engine(replica).connect() as connection:
+          connection.exec_driver_sql('SELECT 1')
+        replica.healthy = True
+      except SQLAlchemyError as e:
+        if replica.healthy:
+          self.app.logger.warning('Replica %s failed its health check: %s', replica.bind_key, e)
+        replica.healthy = False
+    return replica.healthy
+
+  def choose(self):
+    """Engine of the next healthy replica, or None."""
+    for _ in range(len(self.replicas)):
+      replica = self.replicas[next(self._turns) % len(self.replicas)]
+      if self.is_healthy(replica):
+        return self.engine(replica)
+    return None
+
+
+def reads_from_replica():
+  if not has_request_context() or request.method not in ('GET', 'HEAD'):
+    return False
+  return flask_session.get('_primary_until', 0) <= time.time()
+
+
+class RoutingSession(SignallingSession):
+  """Session reading from a replica during GET requests, see above."""
+
+  def __init__(self, db, **options):
+    super().__init__(db, **options)
+    # Replica engine this session reads from, picked on its first read.
+    self._replica = None
+
+  def get_bind(self, mapper=None, clause=None, **kwargs):
+    if self._flushing or isinstance(clause, UpdateBase):
+      if has_request_context():
+        flask_session['_primary_until'] = time.time() + self.app.config['SQLALCHEMY_REPLICA_STICKY_SECONDS']
+      return super().get_bind(mapper, clause)
+    replicas = self.app.extensions['sqlalchemy_replicas']
+    if replicas.replicas and reads_from_replica():
+      if self._replica is None:
+        self._replica = replicas.choose()
+      if self._replica is not None:
+        return self._replica
+    return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+  """Flask-SQLAlchemy with sessions that route reads to replicas."""
+
+  def init_app(self, app):
+    app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+    app.config.setdefault('SQLALCHEMY_REPLICA_CHECK_INTERVAL', 5)
+    app.config.setdefault('SQLALCHEMY_REPLICA_STICKY_SECONDS', 5)
+    super().init_app(app)
+
+    binds = dict(app.config['SQLALCHEMY_BINDS'] or {})
+    bind_keys = []
+    for number, uri in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']):
+      bind_keys.append('replica{}'.format(number))
+      binds[bind_keys[-1]] = uri
+    app.config['SQLALCHEMY_BINDS'] = binds or None
+    app.extensions['sqlalchemy_replicas'] = ReplicaSet(
+      self, app, bind_keys, app.config['SQLALCHEMY_REPLICA_CHECK_INTERVAL'])
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+  def dispose_engines(self, app):
+    """Forget the pooled connections of `app`'s engines, primary and replicas.
+
+    For a forked child: the connections are left open for the parent that
+    created them, and the child's pools open their own.
+    """
+    for connector in app.extensions['sqlalchemy'].connectors.values():
+      if connector._engine is not None:
+        connector._engine.dispose(close=False)
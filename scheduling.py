@@ -0,0 +1,139 @@
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from sqlalchemy import DateTime, Integer, column, insert, select, values
+from models import db, Venue, Artist, Show, show_period
+
+#----------------------------------------------------------------------------#
+# Scheduling conflicts.
+#----------------------------------------------------------------------------#
+
+# A venue hosts one show at a time and an artist plays one show at a time;
+# each show occupies [start_time, start_time + duration_minutes). The
+# exclusion constraints on "Show" enforce it on every write. find_conflicts()
+# checks proposed shows before they are written, so forms, imports and the API
+# can report every conflict instead of failing on the first. It checks a whole
+# batch in one query, answered from the constraints' GiST indexes.
+
+Booking = namedtuple('Booking', 'venue_id artist_id start_time duration_minutes')
+
+# What a booking overlaps: the venue's or the artist's (`kind`) existing show
+# `show_id`, or the earlier booking of the same batch at index `booking`.
+Conflict = namedtuple('Conflict', 'kind start_time end_time show_id booking')
+
+# What became of a booking passed to book_shows(): the id of its new show, or
+# None with the reasons. A name is None when there is no venue or artist with
+# the booking's id.
+Outcome = namedtuple('Outcome', 'show_id venue_name artist_name conflicts')
+
+OWNERS = (('venue', 'venue_id'), ('artist', 'artist_id'))
+
+# SQLSTATE of an exclusion constraint violation.
+EXCLUSION_VIOLATION = '23P01'
+
+
+def end_time(start_time, duration_minutes):
+  return start_time + timedelta(minutes=duration_minutes)
+
+
+def is_conflict_error(error):
+  """Whether an IntegrityError comes from the exclusion constraints, i.e. a show was booked meanwhile."""
+  return getattr(error.orig, 'pgcode', None) == EXCLUSION_VIOLATION
+
+
+def find_conflicts(bookings):
+  """The conflicts of each of `bookings`, as one list of Conflict per booking (empty if it fits)."""
+  conflicts = [[] for _ in bookings]
+  if not bookings:
+    return conflicts
+
+  proposed = values(
+    column('booking', Integer),
+    column('venue_id', Integer),
+    column('artist_id', Integer),
+    column('start_time', DateTime),
+    column('duration_minutes', Integer),
+    name='proposed',
+  ).data([(index,) + tuple(booking) for index, booking in enumerate(bookings)])
+  overlapping = show_period(Show.start_time, Show.duration_minutes) \
+    .op('&&')(show_period(proposed.c.start_time, proposed.c.duration_minutes))
+  # Each side of the OR is answered by one of the GiST indexes.
+  rows = db.session.execute(
+    select(proposed.c.booking, proposed.c.venue_id, proposed.c.artist_id,
+           Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.duration_minutes)
+      .join(Show, ((Show.venue_id == proposed.c.venue_id) & overlapping) |
+                  ((Show.artist_id == proposed.c.artist_id) & overlapping))
+      .order_by(proposed.c.booking, Show.start_time))
+  for index, venue_id, artist_id, show_id, show_venue_id, show_artist_id, start_time, duration_minutes in rows:
+    show_end = end_time(start_time, duration_minutes)
+    if show_venue_id == venue_id:
+      conflicts[index].append(Conflict('venue', start_time, show_end, show_id, None))
+    if show_artist_id == artist_id:
+      conflicts[index].append(Conflict('artist', start_time, show_end, show_id, None))
+
+  # Bookings of the batch overlapping each other.
+  for kind, key in OWNERS:
+    by_owner = defaultdict(list)
+    for index, booking in enumerate(bookings):
+      by_owner[getattr(booking, key)].append(index)
+    for indexes in by_owner.values():
+      for position, index in enumerate(indexes):
+        booking = bookings[index]
+        for earlier in indexes[:position]:
+          other = bookings[earlier]
+          other_end = end_time(other.start_time, other.duration_minutes)
+          if other.start_time < end_time(booking.start_time, booking.duration_minutes) \
+              and booking.start_time < other_end:
+            conflicts[index].append(Conflict(kind, other.start_time, other_end, None, earlier))
+  return conflicts
+
+
+def names_by_id(model, ids):
+  if not ids:
+    return {}
+  return dict(db.session.execute(select(model.id, model.name).where(model.id.in_(ids))).all())
+
+
+def book_shows(bookings):
+  """Add the shows of `bookings` that can be booked; return an Outcome per booking.
+
+  Checks the venue and artist ids with one IN query per table and the
+  conflicts with one find_conflicts() query, then inserts the shows in a
+  single statement. A booking overlapping an earlier one of the batch is only
+  turned down when that one was booked. The caller commits; the commit raises
+  an IntegrityError passing is_conflict_error() when another show was booked
+  meanwhile.
+  """
+  venue_names = names_by_id(Venue, {booking.venue_id for booking in bookings})
+  artist_names = names_by_id(Artist, {booking.artist_id for booking in bookings})
+  known = [index for index, booking in enumerate(bookings)
+           if booking.venue_id in venue_names and booking.artist_id in artist_names]
+
+  conflicts = [[] for _ in bookings]
+  booked = set()
+  for index, booking_conflicts in zip(known, find_conflicts([bookings[index] for index in known])):
+    for conflict in booking_conflicts:
+      if conflict.booking is not None:
+        # Numbered among the known bookings; keep it if that one was booked.
+        conflict = conflict._replace(booking=known[conflict.booking])
+        if conflict.booking not in booked:
+          continue
+      conflicts[index].append(conflict)
+    if not conflicts[index]:
+      booked.add(index)
+
+  show_ids = {}
+  if booked:
+    inserted = db.session.execute(
+      insert(Show)
+        .values([bookings[index]._asdict() for index in sorted(booked)])
+        .returning(Show.id, Show.venue_id, Show.start_time))
+    # A venue holds one show at a time, so (venue_id, start_time) tells them apart.
+    show_ids = {(venue_id, start_time): id for id, venue_id, start_time in inserted}
+  return [
+    Outcome(
+      show_ids.get((booking.venue_id, booking.start_time)) if index in booked else None,
+      venue_names.get(booking.venue_id),
+      artist_names.get(booking.artist_id),
+      conflicts[index])
+    for index, booking in enumerate(bookings)
+  ]
@@ -0,0 +1,50 @@
+import re
+from sqlalchemy import func, select, true
+from models import db
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist rows carry a search_vector (name, city, state and genres)
+# kept up to date by a trigger, with a GIN index on it and a pg_trgm GIN index
+# on name. A search term matches a row when every word of it prefixes a word
+# of the vector, or when it appears anywhere in the name; both conditions are
+# answered from the indexes. Results are ranked by text rank plus name
+# similarity and capped at `limit`. Upcoming show counts are read from the
+# precomputed upcoming_shows_count column (see counters.py). The listing
+# filters (queries.catalog_conditions) narrow the matches further.
+
+def search_condition(model, term):
+  """Where clause picking the rows of `model` matching `term`, and their rank (None if `term` has no words)."""
+  words = re.findall(r'\w+', term.lower())
+  if not words:
+    return true(), None
+
+  tsquery = func.to_tsquery('simple', ' & '.join(word + ':*' for word in words))
+  # LIKE wildcards in the term are escaped with PostgreSQL's default escape, a backslash.
+  pattern = '%' + re.sub(r'([\\%_])', r'\\\1', term) + '%'
+  rank = func.ts_rank(model.search_vector, tsquery) + func.similarity(model.name, term)
+  return model.search_vector.op('@@')(tsquery) | model.name.ilike(pattern), rank
+
+
+def search_query(model, term, limit, conditions=()):
+  """Statement selecting the ranked (id, name, num_upcoming_shows) rows of `model` matching `term` and `conditions`."""
+  query = select(
+    model.id,
+    model.name,
+    model.upcoming_shows_count.label('num_upcoming_shows')
+  ).where(*conditions)
+
+  condition, rank = search_condition(model, term)
+  if rank is None:
+    return query.order_by(model.name).limit(limit)
+
+  return query.where(condition) \
+    .order_by(rank.desc(), model.name) \
+    .limit(limit)
+
+
+def search(model, term, limit, conditions=()):
+  """Ranked (id, name, num_upcoming_shows) rows of `model` matching `term` and `conditions`, see `search_query`."""
+  return db.session.execute(search_query(model, term, limit, conditions)).all()
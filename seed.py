@@ -0,0 +1,165 @@
+import random
+import time
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, text
+from bulk import batches
+from cache import invalidate_from_command
+from counters import refresh_upcoming_counts
+from enums import Genre
+from geo import city_location
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+# Fills the database with reproducible fake venues, artists and shows for load
+# tests and benchmarks. The same --seed always produces the same rows. Show
+# start times fall within two years either side of today, so every venue and
+# artist has both past and upcoming shows. The schema uses PostgreSQL types
+# (ARRAY, TSVECTOR), so this needs a PostgreSQL database.
+
+SCALES = {
+  # name: (venues, artists, shows)
+  '1k': (100, 200, 1000),
+  '100k': (5000, 10000, 100000),
+  '1m': (20000, 50000, 1000000),
+}
+
+CITIES = [
+  ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'), ('Brooklyn', 'NY'),
+  ('Chicago', 'IL'), ('Austin', 'TX'), ('Houston', 'TX'), ('Nashville', 'TN'),
+  ('New Orleans', 'LA'), ('Seattle', 'WA'), ('Portland', 'OR'), ('Denver', 'CO'),
+  ('Atlanta', 'GA'), ('Miami', 'FL'), ('Boston', 'MA'), ('Detroit', 'MI'),
+]
+
+WORDS = [
+  'Blue', 'Red', 'Golden', 'Silver', 'Velvet', 'Electric', 'Midnight', 'Sunset', 'Neon',
+  'Wild', 'Quiet', 'Royal', 'Broken', 'Crystal', 'Iron', 'Paper', 'Hollow', 'Lucky',
+]
+VENUE_KINDS = ['Room', 'Hall', 'Lounge', 'Theatre', 'Club', 'Tavern', 'Garden', 'Stage', 'Cellar']
+ARTIST_KINDS = ['Band', 'Quartet', 'Collective', 'Orchestra', 'Trio', 'Project', 'Brothers', 'Sisters']
+
+
+def fake_phone(rng):
+  return '{:03d}-{:03d}-{:04d}'.format(rng.randint(200, 999), rng.randint(200, 999), rng.randint(0, 9999))
+
+
+def fake_name(rng, kinds, number):
+  return 'The {} {} {} {}'.format(rng.choice(WORDS), rng.choice(WORDS), rng.choice(kinds), number)
+
+
+def fake_venue(rng, number):
+  city, state = rng.choice(CITIES)
+  # Spread around the city centre so nearby searches have distances to sort.
+  latitude, longitude = city_location(city, state)
+  return {
+    'name': fake_name(rng, VENUE_KINDS, number),
+    'city': city,
+    'state': state,
+    'address': '{} {} Street'.format(rng.randint(1, 9999), rng.choice(WORDS)),
+    'phone': fake_phone(rng),
+    'image_link': 'https://picsum.photos/seed/venue{}/400/300'.format(number),
+    'genres': rng.sample([genre.name for genre in Genre], rng.randint(1, 3)),
+    'facebook_link': 'https://www.facebook.com/venue{}'.format(number),
+    'website_link': 'https://venue{}.example.com'.format(number),
+    'seeking_talent': rng.random() < 0.5,
+    'seeking_description': 'Looking for local acts.',
+    'latitude': latitude + rng.uniform(-0.05, 0.05),
+    'longitude': longitude + rng.uniform(-0.05, 0.05),
+  }
+
+
+def fake_artist(rng, number):
+  city, state = rng.choice(CITIES)
+  return {
+    'name': fake_name(rng, ARTIST_KINDS, number),
+    'city': city,
+    'state': state,
+    'phone': fake_phone(rng),
+    'genres': rng.sample([genre.name for genre in Genre], rng.randint(1, 3)),
+    'image_link': 'https://picsum.photos/seed/artist{}/400/300'.format(number),
+    'facebook_link': 'https://www.facebook.com/artist{}'.format(number),
+    'website_link': 'https://artist{}.example.com'.format(number),
+    'seeking_venues': rng.random() < 0.5,
+    'seeking_description': 'Looking for places to play.',
+  }
+
+
+def fake_shows(rng, venue_ids, artist_ids, count, today):
+  # At most one show a day per venue and per artist, starting between 18:00
+  # and 22:00 and over by midnight, so they never overlap each other; they
+  # only involve the venues and artists just generated, so they cannot overlap
+  # the shows already in the database either.
+  days = 1461
+  taken_venues, taken_artists = set(), set()
+  for _ in range(count):
+    for _ in range(100):
+      venue_id, artist_id, day = rng.choice(venue_ids), rng.choice(artist_ids), rng.randrange(days)
+      venue_day, artist_day = venue_id * days + day, artist_id * days + day
+      if venue_day not in taken_venues and artist_day not in taken_artists:
+        break
+    else:
+      raise click.UsageError('Too many shows for the venues and artists: each plays one show a day at most.')
+    taken_venues.add(venue_day)
+    taken_artists.add(artist_day)
+    yield {
+      'venue_id': venue_id,
+      'artist_id': artist_id,
+      'start_time': today + timedelta(days=day - days // 2, hours=rng.choice([18, 19, 20, 21, 22])),
+      'duration_minutes': rng.choice([60, 90, 120]),
+    }
+
+
+def insert_rows(model, rows, batch_size):
+  """Insert generated rows in batches; return the first id they may have been given."""
+  first_id = (db.session.query(func.max(model.id)).scalar() or 0) + 1
+  for batch in batches(rows, batch_size):
+    db.session.execute(insert(model.__table__), batch)
+    db.session.commit()
+  return first_id
+
+
+def ids_from(model, first_id):
+  return [id for id, in db.session.query(model.id).filter(model.id >= first_id).order_by(model.id)]
+
+
+@click.command('seed')
+@click.option('--scale', type=click.Choice(sorted(SCALES)), default='1k', show_default=True,
+              help='Preset number of venues, artists and shows.')
+@click.option('--venues', type=int, help='Number of venues, overriding --scale.')
+@click.option('--artists', type=int, help='Number of artists, overriding --scale.')
+@click.option('--shows', type=int, help='Number of shows, overriding --scale.')
+@click.option('--seed', default=0, show_default=True, help='Random seed.')
+@click.option('--reset', is_flag=True, help='Delete all venues, artists and shows first.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows inserted per statement.')
+@with_appcontext
+def seed(scale, venues, artists, shows, seed, reset, batch_size):
+  """Fill the database with reproducible synthetic venues, artists and shows."""
+  num_venues, num_artists, num_shows = SCALES[scale]
+  num_venues = venues if venues is not None else num_venues
+  num_artists = artists if artists is not None else num_artists
+  num_shows = shows if shows is not None else num_shows
+  rng = random.Random(seed)
+  started = time.perf_counter()
+
+  if reset:
+    db.session.execute(text('TRUNCATE "Show", "Venue", "Artist" RESTART IDENTITY CASCADE'))
+    db.session.commit()
+
+  venue_ids = ids_from(Venue, insert_rows(Venue, (fake_venue(rng, n) for n in range(num_venues)), batch_size))
+  artist_ids = ids_from(Artist, insert_rows(Artist, (fake_artist(rng, n) for n in range(num_artists)), batch_size))
+  if num_shows and not (venue_ids and artist_ids):
+    raise click.UsageError('Shows need at least one venue and one artist.')
+
+  today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+  show_rows = fake_shows(rng, venue_ids, artist_ids, num_shows, today)
+  insert_rows(Show, show_rows, batch_size)
+  # Half of the shows are in the past; take them out of the upcoming counts.
+  refresh_upcoming_counts()
+  invalidate_from_command()
+
+  click.echo('Seeded {} venues, {} artists and {} shows in {:.1f}s.'.format(
+    num_venues, num_artists, num_shows, time.perf_counter() - started))
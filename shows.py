@@ -0,0 +1,221 @@
+import sys
+from datetime import datetime
+from flask import Blueprint, Response, current_app, flash, render_template, request, stream_template
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import noload
+import queries
+from cache import cache
+from conditional import conditional
+from geo import nearby_shows_query, requested_area
+from models import db, Venue, Artist, Show
+from pages import feed_page, listing_validators, parse_show_cursor, show_namespaces
+from scheduling import Booking, book_shows, find_conflicts, is_conflict_error
+
+#----------------------------------------------------------------------------#
+# Show routes.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('shows', __name__)
+
+@bp.route('/shows')
+@conditional(lambda: listing_validators(Show))
+@cache.cached('shows')
+def shows():
+  # displays list of shows at /shows, ordered by (start_time, id).
+  # Pages are keyset paginated: ?after=<cursor> continues after the last show
+  # of the previous page. ?stream=1 streams the rest of the feed instead,
+  # rendering rows as they are fetched in SHOWS_STREAM_BATCH_SIZE batches.
+  after = request.args.get('after')
+  query = queries.show_feed_query(parse_show_cursor(after) if after else None)
+
+  if request.args.get('stream'):
+    rows = db.session.execute(
+      query.execution_options(yield_per=current_app.config['SHOWS_STREAM_BATCH_SIZE']))
+    return Response(stream_template('pages/shows.html', shows=rows))
+
+  rows = db.session.execute(query.limit(current_app.config['SHOWS_PER_PAGE'] + 1)).all()
+  data, next_cursor = feed_page(rows)
+  return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
+
+@bp.route('/shows/near')
+def nearby_shows():
+  # The next upcoming shows at the venues near ?lat=&lng=[&radius=] or in
+  # ?bbox= (see venues.nearby_venues).
+  area = requested_area()
+  shows = []
+  if area is not None:
+    shows = db.session.execute(
+      nearby_shows_query(area, datetime.now(), current_app.config['NEARBY_RESULTS_LIMIT'])).all()
+  return render_template('pages/nearby_shows.html', area=area, shows=shows)
+  
+ 
+@bp.route('/shows/create')
+def create_shows():
+  from forms import ShowForm
+  # renders form. do not touch.
+  form = ShowForm()
+  return render_template('forms/new_show.html', form=form)
+
+
+def conflict_message(conflict, venue_name, artist_name, lines=None):
+  # `lines` numbers the bookings of a batch, for conflicts between them.
+  if conflict.start_time.date() == conflict.end_time.date():
+    period = '{:%Y-%m-%d} from {:%H:%M} to {:%H:%M}'.format(conflict.start_time, conflict.start_time, conflict.end_time)
+  else:
+    period = 'from {:%Y-%m-%d %H:%M} to {:%Y-%m-%d %H:%M}'.format(conflict.start_time, conflict.end_time)
+  if conflict.booking is not None:
+    period = '{} (line {})'.format(period, lines[conflict.booking])
+  if conflict.kind == 'venue':
+    return '{} already has a show on {}.'.format(venue_name, period)
+  return '{} is already playing on {}.'.format(artist_name, period)
+
+def booking_errors(showform):
+  # Puts the reasons the show can't be booked on the form's fields; returns
+  # the venue and artist, or None when there was any.
+  venue = Venue.query.options(noload(Venue.shows)).get(showform.venue_id.data)
+  artist = Artist.query.options(noload(Artist.shows)).get(showform.artist_id.data)
+  if venue is None:
+    showform.venue_id.errors.append('There is no venue with this ID.')
+  if artist is None:
+    showform.artist_id.errors.append('There is no artist with this ID.')
+  if venue is None or artist is None:
+    return None
+  booking = Booking(venue.id, artist.id, showform.start_time.data, showform.duration_minutes.data)
+  for conflict in find_conflicts([booking])[0]:
+    showform.start_time.errors.append(conflict_message(conflict, venue.name, artist.name))
+  if showform.start_time.errors:
+    return None
+  return venue, artist
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+  from forms import ShowForm
+  showform = ShowForm(request.form)
+  booked = showform.validate() and booking_errors(showform)
+  if not booked:
+    return render_template('forms/new_show.html', form=showform)
+  venue, artist = booked
+  error = False
+  try: 
+    show = Show(
+      venue_id=venue.id,
+      artist_id=artist.id,
+      start_time=showform.start_time.data,
+      duration_minutes=showform.duration_minutes.data
+    )
+    db.session.add(show)
+    namespaces = show_namespaces([show])
+    db.session.commit()
+  except IntegrityError as e:
+    db.session.rollback()
+    if is_conflict_error(e):
+      # Another show was booked between the check and the insert.
+      showform.start_time.errors.append('The venue or the artist was just booked at this time.')
+      return render_template('forms/new_show.html', form=showform)
+    error = True
+    print(sys.exc_info())
+  except:
+    error = True
+    db.session.rollback()
+    print(sys.exc_info()) 
+  else:
+    cache.invalidate(*namespaces)
+  finally: 
+    db.session.close()
+  if error:
+    flash('An error occurred. Show could not be listed.')
+  else: 
+    flash('Show was successfully listed!')
+  return render_template('pages/home.html')
+
+
+@bp.route('/shows/create/batch')
+def create_show_batch():
+  from forms import ShowBatchForm
+  form = ShowBatchForm()
+  return render_template('forms/new_shows.html', form=form)
+
+
+def read_batch(form):
+  # The (line number, line, booking) of each show of the batch form; puts the
+  # lines it can't read on the form's errors.
+  batch = []
+  for number, line in enumerate(form.shows.data.splitlines(), 1):
+    if not line.strip():
+      continue
+    fields = [field.strip() for field in line.split(',')]
+    try:
+      if len(fields) not in (3, 4):
+        raise ValueError(line)
+      booking = Booking(
+        venue_id=int(fields[1]),
+        artist_id=int(fields[0]),
+        start_time=datetime.fromisoformat(fields[2]),
+        duration_minutes=int(fields[3]) if len(fields) == 4 else form.duration_minutes.data)
+      if booking.start_time.tzinfo is not None or not 0 < booking.duration_minutes <= 24 * 60:
+        raise ValueError(line)
+    except ValueError:
+      form.shows.errors.append(
+        'Line {}: expected "artist ID, venue ID, YYYY-MM-DD HH:MM" and optionally the minutes.'.format(number))
+      continue
+    batch.append((number, line, booking))
+  if len(batch) > current_app.config['BOOKING_BATCH_LIMIT']:
+    form.shows.errors.append('At most {} shows at a time.'.format(current_app.config['BOOKING_BATCH_LIMIT']))
+  return batch
+
+def outcome_messages(outcome, lines):
+  # Why a show of the batch wasn't booked.
+  messages = []
+  if outcome.venue_name is None:
+    messages.append('There is no venue with this ID.')
+  if outcome.artist_name is None:
+    messages.append('There is no artist with this ID.')
+  for conflict in outcome.conflicts:
+    messages.append(conflict_message(conflict, outcome.venue_name, outcome.artist_name, lines))
+  return messages
+
+@bp.route('/shows/create/batch', methods=['POST'])
+def create_show_batch_submission():
+  # Books every show of the batch that can be booked, in one transaction, and
+  # lists what became of each line. The lines that weren't booked are left in
+  # the form to be fixed and sent again.
+  from forms import ShowBatchForm
+  form = ShowBatchForm(request.form)
+  batch = read_batch(form) if form.validate() else None
+  if not batch or form.shows.errors:
+    return render_template('forms/new_shows.html', form=form)
+  numbers = [number for number, _, _ in batch]
+  bookings = [booking for _, _, booking in batch]
+  error = False
+  try:
+    outcomes = book_shows(bookings)
+    db.session.commit()
+  except IntegrityError as e:
+    db.session.rollback()
+    if is_conflict_error(e):
+      # Another show was booked between the checks and the insert.
+      form.shows.errors.append('A venue or an artist was just booked at one of these times; nothing was listed.')
+      return render_template('forms/new_shows.html', form=form)
+    error = True
+    print(sys.exc_info())
+  except:
+    error = True
+    db.session.rollback()
+    print(sys.exc_info())
+  else:
+    cache.invalidate(*show_namespaces(
+      [booking for booking, outcome in zip(bookings, outcomes) if outcome.show_id is not None]))
+  finally:
+    db.session.close()
+  if error:
+    flash('An error occurred. The shows could not be listed.')
+    return render_template('pages/home.html')
+
+  results = [
+    {'line': number, 'booking': booking, 'outcome': outcome, 'errors': outcome_messages(outcome, numbers)}
+    for number, booking, outcome in zip(numbers, bookings, outcomes)
+  ]
+  form.shows.data = '\n'.join(line for (_, line, _), outcome in zip(batch, outcomes) if outcome.show_id is None)
+  flash('{} of {} shows were successfully listed.'.format(
+    sum(outcome.show_id is not None for outcome in outcomes), len(outcomes)))
+  return render_template('forms/new_shows.html', form=form, results=results)
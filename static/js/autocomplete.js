@@ -0,0 +1,74 @@
+// Name lookups of the show forms: typing in an input with
+// data-autocomplete="<suggestions URL>" lists the matching names, and picking
+// one fills the field named by data-target with its ID.
+(function () {
+  document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+    var target = input.form.elements[input.dataset.target];
+    var list = document.createElement('ul');
+    list.className = 'list-group autocomplete-results';
+    input.parentNode.insertBefore(list, input.nextSibling);
+    var latest = 0;
+    var active = -1;
+
+    function choose(item) {
+      input.value = item.dataset.name;
+      target.value = item.dataset.id;
+      list.innerHTML = '';
+    }
+
+    function highlight(index) {
+      var items = list.children;
+      if (!items.length) return;
+      active = (index + items.length) % items.length;
+      for (var i = 0; i < items.length; i++) {
+        items[i].classList.toggle('active', i === active);
+      }
+    }
+
+    input.addEventListener('input', function () {
+      var query = input.value.trim();
+      // Only the answer to the last keystroke is shown.
+      var request = ++latest;
+      if (!query) {
+        list.innerHTML = '';
+        return;
+      }
+      fetch(input.dataset.autocomplete + '?q=' + encodeURIComponent(query))
+        .then(function (response) { return response.json(); })
+        .then(function (body) {
+          if (request !== latest) return;
+          list.innerHTML = '';
+          active = -1;
+          body.data.forEach(function (match) {
+            var item = document.createElement('li');
+            item.className = 'list-group-item';
+            item.textContent = match.name + ' (#' + match.id + ')';
+            item.dataset.id = match.id;
+            item.dataset.name = match.name;
+            item.addEventListener('mousedown', function (event) {
+              event.preventDefault();
+              choose(item);
+            });
+            list.appendChild(item);
+          });
+        });
+    });
+
+    input.addEventListener('keydown', function (event) {
+      if (event.key === 'ArrowDown') {
+        highlight(active + 1);
+      } else if (event.key === 'ArrowUp') {
+        highlight(active - 1);
+      } else if (event.key === 'Enter' && active >= 0 && list.children[active]) {
+        choose(list.children[active]);
+      } else {
+        return;
+      }
+      event.preventDefault();
+    });
+
+    input.addEventListener('blur', function () {
+      list.innerHTML = '';
+    });
+  });
+})();
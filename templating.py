@@ -0,0 +1,55 @@
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Template bytecode cache.
+#----------------------------------------------------------------------------#
+
+# Jinja parses and compiles each template to Python code the first time a
+# process renders it. With TEMPLATE_BYTECODE_CACHE_DIR set, the compiled code
+# is written to that directory and later processes load it from there instead,
+# so new workers skip the parsing. Build steps fill it ahead of time:
+#
+#     flask compile-templates
+#
+# Entries are keyed by template path and carry a checksum of the source, so an
+# edited template is compiled again; the directory must be the same path at
+# build time and at run time.
+
+class BytecodeCache(FileSystemBytecodeCache):
+  """FileSystemBytecodeCache creating its directory on the first write, not when the app is built."""
+
+  def dump_bytecode(self, bucket):
+    os.makedirs(self.directory, exist_ok=True)
+    super().dump_bytecode(bucket)
+
+  def clear(self):
+    if os.path.isdir(self.directory):
+      super().clear()
+
+
+def init_bytecode_cache(app):
+  directory = app.config.get('TEMPLATE_BYTECODE_CACHE_DIR')
+  if directory:
+    app.jinja_env.bytecode_cache = BytecodeCache(directory)
+
+
+@click.command('compile-templates')
+@with_appcontext
+def compile_templates():
+  """Compile every template into the template bytecode cache."""
+  env = current_app.jinja_env
+  if env.bytecode_cache is None:
+    raise click.ClickException('TEMPLATE_BYTECODE_CACHE_DIR is not set.')
+  started = time.perf_counter()
+  # Drop the entries of templates that were renamed or removed.
+  env.bytecode_cache.clear()
+  names = env.list_templates(extensions=['html'])
+  for name in names:
+    env.get_template(name)
+  click.echo('Compiled {} templates into {} in {:.2f}s.'.format(
+    len(names), current_app.config['TEMPLATE_BYTECODE_CACHE_DIR'], time.perf_counter() - started))
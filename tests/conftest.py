@@ -0,0 +1,88 @@
+import os
+import sys
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from app import create_app
+from models import db
+
+#----------------------------------------------------------------------------#
+# Fixtures.
+#----------------------------------------------------------------------------#
+
+# The tests run against a scratch PostgreSQL database named by
+# TEST_DATABASE_URL, migrated to the latest revision and emptied by each test
+# that fills it. Without it they are skipped; the `offline_app` tests and the
+# ones that need no app run anyway.
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+
+def make_config(**overrides):
+  settings = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+  settings.update(
+    SQLALCHEMY_DATABASE_URI=TEST_DATABASE_URL,
+    SQLALCHEMY_REPLICA_URIS=[],
+    # Every request builds its page.
+    CACHE_TYPE='null',
+    DEBUG=False,
+    TESTING=True,
+    WTF_CSRF_ENABLED=False,
+    TEMPLATE_BYTECODE_CACHE_DIR='',
+  )
+  settings.update(overrides)
+  return type('TestConfig', (object,), settings)
+
+
+@pytest.fixture(scope='session')
+def app():
+  if not TEST_DATABASE_URL:
+    pytest.skip('TEST_DATABASE_URL is not set')
+  from flask_migrate import upgrade
+  app = create_app(make_config())
+  with app.app_context():
+    upgrade(directory=os.path.join(ROOT, 'migrations'))
+  return app
+
+
+@pytest.fixture
+def client(app):
+  # Requests push their own app context, as they do when served.
+  return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def offline_app():
+  """The app on a database that can't be reached, for requests refused before any query."""
+  return create_app(make_config(SQLALCHEMY_DATABASE_URI='postgresql://fyyur@localhost:1/offline'))
+
+
+@pytest.fixture
+def offline_client(offline_app):
+  return offline_app.test_client()
+
+
+@contextmanager
+def counting_statements():
+  """Collect the SQL statements executed inside the block, on any engine."""
+  statements = []
+
+  def count(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+  event.listen(Engine, 'before_cursor_execute', count)
+  try:
+    yield statements
+  finally:
+    event.remove(Engine, 'before_cursor_execute', count)
+
+
+@pytest.fixture
+def statements():
+  return counting_statements
@@ -0,0 +1,72 @@
+import base64
+import json
+from datetime import datetime
+import pytest
+from api import ApiError, decode_cursor, encode_cursor
+
+#----------------------------------------------------------------------------#
+# API cursors and fields.
+#----------------------------------------------------------------------------#
+
+# A cursor is the sort key of the last row of a page, in base64 JSON. The
+# ones a client altered, and unknown ?fields=, are refused with a 400 before
+# any query runs, so these requests need no database.
+
+
+def raw_cursor(values):
+  return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('values, types', [
+  ([42], (int,)),
+  ([datetime(2026, 11, 6, 21, 30), 42], (datetime.fromisoformat, int)),
+  ([datetime(2026, 11, 6, 21, 30, 15, 250000), 1], (datetime.fromisoformat, int)),
+])
+def test_cursor_round_trip(values, types):
+  cursor = encode_cursor(values)
+  assert '=' not in cursor
+  assert decode_cursor(cursor, types) == values
+
+
+@pytest.mark.parametrize('cursor', [
+  'not a cursor!',
+  'abc',
+  raw_cursor({'id': 1}),
+  raw_cursor(5),
+  raw_cursor(['one']),
+  raw_cursor([1, 2]),
+  raw_cursor([None]),
+  base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+])
+def test_malformed_cursor(cursor):
+  with pytest.raises(ApiError) as error:
+    decode_cursor(cursor, (int,))
+  assert error.value.status == 400
+
+
+@pytest.mark.parametrize('path', [
+  '/api/v1/venues?cursor=abc',
+  '/api/v1/artists?cursor=' + raw_cursor(['1; DROP TABLE "Artist"']),
+  '/api/v1/shows?cursor=' + raw_cursor([42]),
+  '/api/v1/shows?cursor=' + raw_cursor(['yesterday', 42]),
+  # A page cursor of /venues isn't one of /shows.
+  '/api/v1/shows?cursor=' + encode_cursor([42]),
+])
+def test_tampered_cursor_is_refused(offline_client, path):
+  response = offline_client.get(path)
+  assert response.status_code == 400
+  assert response.get_json() == {'error': 'Invalid cursor.'}
+
+
+@pytest.mark.parametrize('path', [
+  '/api/v1/venues?fields=id,name,password',
+  '/api/v1/artists?fields=password',
+  '/api/v1/shows?fields=start_time,password',
+  '/api/v1/venues/1?fields=password',
+  '/api/v1/artists/1?fields=password',
+  '/api/v1/shows/1?fields=password',
+])
+def test_unknown_fields_are_refused(offline_client, path):
+  response = offline_client.get(path)
+  assert response.status_code == 400
+  assert response.get_json() == {'error': 'Unknown fields: password'}
@@ -0,0 +1,139 @@
+import pytest
+import redis
+from flask import Flask, Response, flash, get_flashed_messages
+from cache import LRUCache, RedisCache, ViewCache
+
+#----------------------------------------------------------------------------#
+# View cache, without a database.
+#----------------------------------------------------------------------------#
+
+# The cached views count how often they are built, over each backend: the
+# in-process LRU cache and the Redis one, on a dict standing in for a server.
+
+
+class FakeRedis(object):
+  """The redis-py methods RedisCache calls, kept in a dict; timeouts are ignored."""
+
+  def __init__(self):
+    self.data = {}
+
+  def get(self, key):
+    return self.data.get(key)
+
+  def set(self, key, value, ex=None):
+    self.data[key] = value
+
+  def delete(self, key):
+    self.data.pop(key, None)
+
+  def incr(self, key):
+    self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+    return int(self.data[key])
+
+
+class DownRedis(object):
+  """A server that can't be reached."""
+
+  def __getattr__(self, name):
+    def fail(*args, **kwargs):
+      raise redis.ConnectionError('Connection refused')
+    return fail
+
+
+BACKENDS = {
+  'lru': lambda: LRUCache(),
+  'redis': lambda: RedisCache(FakeRedis()),
+}
+
+
+def make_app(backend):
+  app = Flask(__name__)
+  app.secret_key = 'test'
+  cache = ViewCache()
+  cache.backend = backend
+  builds = []
+
+  @app.route('/venues/<int:venue_id>')
+  @cache.cached('venues', 'venue:{venue_id}')
+  def show_venue(venue_id):
+    builds.append(venue_id)
+    # Shows the flashed messages, as the layout does.
+    return ''.join(get_flashed_messages()) + 'venue {}'.format(venue_id)
+
+  @app.route('/shows')
+  @cache.cached('shows')
+  def shows():
+    builds.append('shows')
+    return Response(iter(['show ', 'list']))
+
+  @app.route('/flash')
+  def flash_message():
+    flash('Venue was successfully listed!')
+    return ''
+
+  return app, cache, builds
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def cached_app(request):
+  return make_app(BACKENDS[request.param]())
+
+
+def test_pages_are_built_once(cached_app):
+  app, cache, builds = cached_app
+  client = app.test_client()
+  assert client.get('/venues/1').data == b'venue 1'
+  assert client.get('/venues/1').data == b'venue 1'
+  assert builds == [1]
+
+
+def test_namespace_bump_misses(cached_app):
+  app, cache, builds = cached_app
+  client = app.test_client()
+  client.get('/venues/1')
+  client.get('/venues/2')
+  cache.invalidate('venue:1')
+  client.get('/venues/1')
+  client.get('/venues/2')
+  assert builds == [1, 2, 1]
+  cache.invalidate('venues')
+  client.get('/venues/1')
+  client.get('/venues/2')
+  assert builds == [1, 2, 1, 1, 2]
+
+
+def test_invalidate_all_misses(cached_app):
+  app, cache, builds = cached_app
+  client = app.test_client()
+  client.get('/venues/1')
+  cache.invalidate_all()
+  client.get('/venues/1')
+  assert builds == [1, 1]
+
+
+def test_flashed_messages_bypass_cache(cached_app):
+  app, cache, builds = cached_app
+  client = app.test_client()
+  client.get('/venues/1')
+  client.get('/flash')
+  # The message is shown on the next page, built for this visitor only.
+  assert client.get('/venues/1').data == b'Venue was successfully listed!venue 1'
+  assert client.get('/venues/1').data == b'venue 1'
+  assert builds == [1, 1]
+
+
+def test_streamed_responses_are_not_stored(cached_app):
+  app, cache, builds = cached_app
+  client = app.test_client()
+  assert client.get('/shows').data == b'show list'
+  assert client.get('/shows').data == b'show list'
+  assert builds == ['shows', 'shows']
+
+
+def test_unreachable_redis_misses():
+  app, cache, builds = make_app(RedisCache(DownRedis()))
+  client = app.test_client()
+  assert client.get('/venues/1').data == b'venue 1'
+  assert client.get('/venues/1').data == b'venue 1'
+  cache.invalidate('venue:1')
+  assert builds == [1, 1]
@@ -0,0 +1,96 @@
+import base64
+from datetime import datetime
+import pytest
+from werkzeug.exceptions import BadRequest
+from calendars import EPOCH, decode_sync_token, encode_sync_token, fold, ics_text
+from models import db, Venue
+
+#----------------------------------------------------------------------------#
+# Calendar encoding.
+#----------------------------------------------------------------------------#
+
+
+def unfold(text):
+  return text[:-2].replace('\r\n ', '')
+
+
+@pytest.mark.parametrize('line', [
+  'SUMMARY:' + 'x' * 67,
+  'SUMMARY:' + 'x' * 68,
+  'SUMMARY:' + 'x' * 300,
+  # Two, three and four octet characters, straddling every fold.
+  'SUMMARY:' + 'é' * 120,
+  'SUMMARY:x' + '€' * 90,
+  'LOCATION:' + 'Café 🎷 Théâtre, ' * 12,
+])
+def test_fold(line):
+  folded = fold(line)
+  assert folded.endswith('\r\n')
+  lines = folded[:-2].split('\r\n')
+  assert all(len(part.encode('utf-8')) <= 75 for part in lines)
+  assert all(part.startswith(' ') for part in lines[1:])
+  # Every line is full but for the last one, short of a character at most.
+  assert all(len(part.encode('utf-8')) > 71 for part in lines[:-1])
+  assert unfold(folded) == line
+
+
+def test_short_lines_are_not_folded():
+  assert fold('BEGIN:VEVENT') == 'BEGIN:VEVENT\r\n'
+  assert fold('SUMMARY:' + 'é' * 33) == 'SUMMARY:' + 'é' * 33 + '\r\n'
+
+
+@pytest.mark.parametrize('value, escaped', [
+  ('The Musical Hop', 'The Musical Hop'),
+  ('1015 Folsom Street, San Francisco', '1015 Folsom Street\\, San Francisco'),
+  ('Jazz; Swing', 'Jazz\\; Swing'),
+  ('back\\slash', 'back\\\\slash'),
+  ('two\r\nlines\nthree', 'two\\nlines\\nthree'),
+  ('\\;,', '\\\\\\;\\,'),
+])
+def test_ics_text(value, escaped):
+  assert ics_text(value) == escaped
+
+
+@pytest.mark.parametrize('changed_at', [
+  EPOCH,
+  datetime(2026, 11, 6, 21, 30),
+  datetime(2026, 11, 6, 21, 30, 15, 123456),
+])
+def test_sync_token_round_trip(changed_at):
+  token = encode_sync_token(changed_at)
+  assert '=' not in token
+  assert decode_sync_token(token) == changed_at
+
+
+def token(text):
+  return base64.urlsafe_b64encode(text.encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('since', [
+  'garbage',
+  'a',
+  'é',
+  token('yesterday'),
+  token('2026-11-06T21:30:00+00:00'),
+  token('0001-01-01T00:00:00'),
+  base64.urlsafe_b64encode(b'\xff\xfe\xfd').decode(),
+])
+def test_invalid_sync_token(since):
+  with pytest.raises(BadRequest):
+    decode_sync_token(since)
+
+
+def test_invalid_since_is_refused(app, client):
+  with app.app_context():
+    db.session.execute(db.text('TRUNCATE "Show", "Venue", "Artist" RESTART IDENTITY CASCADE'))
+    venue = Venue(name='Blue Room', city='New York', state='NY', address='1 Main St', phone='555-000-0000',
+                  genres=['Jazz'])
+    db.session.add(venue)
+    db.session.commit()
+    venue_id = venue.id
+  assert client.get('/venues/{}/calendar.ics?since=garbage'.format(venue_id)).status_code == 400
+  assert client.get('/venues/{}/calendar.ics?since={}'.format(venue_id, token('0001-01-01'))).status_code == 400
+  response = client.get('/venues/{}/calendar.ics'.format(venue_id))
+  assert response.status_code == 200
+  since = response.headers['Sync-Token']
+  assert client.get('/venues/{}/calendar.ics?since={}'.format(venue_id, since)).status_code == 200
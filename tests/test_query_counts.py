@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# SQL statements per route.
+#----------------------------------------------------------------------------#
+
+# Each page reads with a fixed number of statements, however many shows its
+# venue or artist has: relationships raise instead of lazy loading, and the
+# views read shows with bounded queries (see queries.py). A new N+1 shows up
+# here as a route going over its budget, or as a busy owner's page costing
+# more than a quiet one's.
+
+# Most statements per request, validators included.
+BUDGETS = {
+  '/': 0,
+  '/venues': 3,
+  '/artists': 3,
+  '/shows': 2,
+  '/shows?stream=1': 2,
+  '/venues/{venue_id}': 5,
+  '/artists/{artist_id}': 5,
+  '/venues/{venue_id}/edit': 1,
+  '/artists/{artist_id}/edit': 1,
+  '/venues/{venue_id}/calendar.ics': 2,
+  '/artists/{artist_id}/calendar.ics': 2,
+  '/venues/search?search_term=blue': 2,
+  '/artists/search?search_term=band': 2,
+  '/api/v1/venues/{venue_id}': 1,
+  '/api/v1/artists/{artist_id}': 1,
+  '/api/v1/shows': 1,
+}
+
+# Shows of the busy venue and artist; the quiet ones have one.
+BUSY_SHOWS = 60
+
+
+def make_venue(number):
+  return Venue(name='Blue Room {}'.format(number), city='New York', state='NY', address='{} Main St'.format(number),
+               phone='555-000-{:04d}'.format(number), genres=['Jazz'])
+
+
+def make_artist(number):
+  return Artist(name='Band {}'.format(number), city='New York', state='NY', phone='555-100-{:04d}'.format(number),
+                genres=['Jazz'])
+
+
+@pytest.fixture
+def owners(app):
+  """Ids of a quiet venue and artist, with one show, and of a busy pair sharing BUSY_SHOWS shows, half of them past."""
+  with app.app_context():
+    return fill_database()
+
+
+def fill_database():
+  db.session.execute(db.text('TRUNCATE "Show", "Venue", "Artist" RESTART IDENTITY CASCADE'))
+  venues = [make_venue(number) for number in range(2)]
+  artists = [make_artist(number) for number in range(2)]
+  db.session.add_all(venues + artists)
+  db.session.flush()
+  start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=BUSY_SHOWS // 2)
+  db.session.add(Show(venue_id=venues[0].id, artist_id=artists[0].id, start_time=start + timedelta(hours=12)))
+  db.session.add_all(Show(venue_id=venues[1].id, artist_id=artists[1].id, start_time=start + timedelta(days=day))
+                     for day in range(BUSY_SHOWS))
+  db.session.commit()
+  owners = {
+    'quiet': {'venue_id': venues[0].id, 'artist_id': artists[0].id},
+    'busy': {'venue_id': venues[1].id, 'artist_id': artists[1].id},
+  }
+  db.session.remove()
+  return owners
+
+
+def statement_count(client, statements, path):
+  client.get(path)
+  with statements() as executed:
+    response = client.get(path)
+    # Streamed pages query as their body is read.
+    response.get_data()
+  assert response.status_code == 200, path
+  return len(executed)
+
+
+@pytest.mark.parametrize('route', sorted(BUDGETS))
+def test_statements_per_route(client, statements, owners, route):
+  quiet = statement_count(client, statements, route.format(**owners['quiet']))
+  busy = statement_count(client, statements, route.format(**owners['busy']))
+  assert busy <= BUDGETS[route], '{} ran {} statements'.format(route, busy)
+  assert busy == quiet, '{} ran {} statements for {} shows, {} for one'.format(route, busy, BUSY_SHOWS, quiet)
+
+
+def test_show_relationships_raise(app, owners):
+  with app.app_context():
+    venue = db.session.get(Venue, owners['busy']['venue_id'])
+    with pytest.raises(InvalidRequestError, match='lazy'):
+      venue.shows
+    db.session.remove()
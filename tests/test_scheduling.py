@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+import pytest
+from models import db, Venue, Artist, Show
+from scheduling import Booking, Conflict, find_conflicts
+
+#----------------------------------------------------------------------------#
+# Scheduling conflicts.
+#----------------------------------------------------------------------------#
+
+# Shows occupy [start_time, start_time + duration_minutes): one ending as the
+# next starts doesn't overlap it, one starting a minute earlier does.
+
+EIGHT_PM = datetime(2030, 5, 1, 20, 0)
+TEN_PM = EIGHT_PM + timedelta(hours=2)
+
+
+@pytest.fixture
+def stored(app):
+  """Ids of two venues and two artists, and of a show of the first pair from 8 to 10 pm."""
+  with app.app_context():
+    db.session.execute(db.text('TRUNCATE "Show", "Venue", "Artist" RESTART IDENTITY CASCADE'))
+    venues = [Venue(name='Venue {}'.format(number), city='New York', state='NY', address='{} Main St'.format(number),
+                    phone='555-000-000{}'.format(number), genres=['Jazz']) for number in range(2)]
+    artists = [Artist(name='Artist {}'.format(number), city='New York', state='NY',
+                      phone='555-100-000{}'.format(number), genres=['Jazz']) for number in range(2)]
+    db.session.add_all(venues + artists)
+    db.session.flush()
+    show = Show(venue_id=venues[0].id, artist_id=artists[0].id, start_time=EIGHT_PM, duration_minutes=120)
+    db.session.add(show)
+    db.session.commit()
+    ids = {'venue': venues[0].id, 'other_venue': venues[1].id, 'artist': artists[0].id,
+           'other_artist': artists[1].id, 'show': show.id}
+    db.session.remove()
+    yield ids
+
+
+def conflicts_of(app, bookings):
+  with app.app_context():
+    return find_conflicts(bookings)
+
+
+def test_no_bookings(app):
+  assert conflicts_of(app, []) == []
+
+
+@pytest.mark.parametrize('start_time, duration_minutes', [
+  (TEN_PM, 60),
+  (EIGHT_PM - timedelta(hours=1), 60),
+  (EIGHT_PM + timedelta(days=1), 120),
+])
+def test_adjacent_shows_fit(app, stored, start_time, duration_minutes):
+  bookings = [
+    Booking(stored['venue'], stored['other_artist'], start_time, duration_minutes),
+    Booking(stored['other_venue'], stored['artist'], start_time, duration_minutes),
+  ]
+  assert conflicts_of(app, bookings) == [[], []]
+
+
+@pytest.mark.parametrize('start_time, duration_minutes', [
+  (TEN_PM - timedelta(minutes=1), 60),
+  (EIGHT_PM - timedelta(hours=1), 61),
+  (EIGHT_PM + timedelta(minutes=30), 30),
+  (EIGHT_PM - timedelta(hours=1), 240),
+])
+def test_overlapping_stored_show(app, stored, start_time, duration_minutes):
+  venue = Conflict('venue', EIGHT_PM, TEN_PM, stored['show'], None)
+  artist = Conflict('artist', EIGHT_PM, TEN_PM, stored['show'], None)
+  # One at a time, as they would overlap each other too.
+  for venue_id, artist_id, expected in [
+    (stored['venue'], stored['other_artist'], [venue]),
+    (stored['other_venue'], stored['artist'], [artist]),
+    (stored['venue'], stored['artist'], [venue, artist]),
+  ]:
+    assert conflicts_of(app, [Booking(venue_id, artist_id, start_time, duration_minutes)]) == [expected]
+
+
+def test_adjacent_bookings_of_a_batch_fit(app, stored):
+  later = EIGHT_PM + timedelta(days=1)
+  bookings = [
+    Booking(stored['venue'], stored['artist'], later, 60),
+    Booking(stored['venue'], stored['other_artist'], later + timedelta(hours=1), 60),
+    Booking(stored['other_venue'], stored['artist'], later - timedelta(hours=1), 60),
+  ]
+  assert conflicts_of(app, bookings) == [[], [], []]
+
+
+def test_overlapping_bookings_of_a_batch(app, stored):
+  later = EIGHT_PM + timedelta(days=1)
+  bookings = [
+    Booking(stored['venue'], stored['artist'], later, 60),
+    Booking(stored['venue'], stored['other_artist'], later + timedelta(minutes=59), 60),
+    Booking(stored['other_venue'], stored['artist'], later - timedelta(minutes=30), 60),
+    Booking(stored['venue'], stored['artist'], later, 120),
+  ]
+  assert conflicts_of(app, bookings) == [
+    [],
+    [Conflict('venue', later, later + timedelta(hours=1), None, 0)],
+    [Conflict('artist', later, later + timedelta(hours=1), None, 0)],
+    [Conflict('venue', later, later + timedelta(hours=1), None, 0),
+     Conflict('venue', later + timedelta(minutes=59), later + timedelta(minutes=119), None, 1),
+     Conflict('artist', later, later + timedelta(hours=1), None, 0),
+     Conflict('artist', later - timedelta(minutes=30), later + timedelta(minutes=30), None, 2)],
+  ]
+
+
+def test_batch_and_stored_conflicts_together(app, stored):
+  bookings = [
+    Booking(stored['venue'], stored['other_artist'], TEN_PM - timedelta(minutes=30), 60),
+    Booking(stored['other_venue'], stored['other_artist'], TEN_PM, 60),
+  ]
+  assert conflicts_of(app, bookings) == [
+    [Conflict('venue', EIGHT_PM, TEN_PM, stored['show'], None)],
+    [Conflict('artist', TEN_PM - timedelta(minutes=30), TEN_PM + timedelta(minutes=30), None, 0)],
+  ]
@@ -0,0 +1,204 @@
+import sys
+from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
+from sqlalchemy.orm import noload
+import queries
+from autocomplete import venue_names
+from cache import cache
+from calendars import calendar_response, calendar_validators
+from conditional import conditional
+from geo import locate, nearby_venues_query, requested_area
+from jobs import enqueue
+from models import db, Venue, Artist, Show
+from pages import (catalog_facets, catalog_filters, detail_validators, listing_validators, search_results,
+  split_shows, touch_shows, venue_areas, venue_namespaces, venue_page)
+from search import search, search_condition
+
+#----------------------------------------------------------------------------#
+# Venue routes.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('venues', __name__)
+
+@bp.route('/venues')
+@conditional(lambda: listing_validators(Venue))
+@cache.cached('venues')
+def venues():
+  # ?genre=, ?state= and ?city= filter the venues; the facets count them per
+  # genre, state and city.
+  filters = catalog_filters()
+  conditions = queries.catalog_conditions(Venue, filters)
+  rows = db.session.execute(queries.venue_areas_query(conditions)).all()
+  facet_rows = db.session.execute(
+    queries.facet_counts_query(Venue, conditions, current_app.config['CATALOG_FACET_LIMIT'])).all()
+  return render_template('pages/venues.html', areas=venue_areas(rows), facets=catalog_facets(facet_rows, filters))
+
+@bp.route('/venues/search', methods=['GET', 'POST'])
+def search_venues():
+  # Takes the listing's filters too; the facet links search again with GET.
+  search_term = request.values.get('search_term', '')
+  filters = catalog_filters()
+  conditions = queries.catalog_conditions(Venue, filters)
+  venues = search(Venue, search_term, current_app.config['SEARCH_RESULTS_LIMIT'], conditions)
+  response = search_results(venues)
+  facet_rows = db.session.execute(queries.facet_counts_query(
+    Venue, conditions + [search_condition(Venue, search_term)[0]], current_app.config['CATALOG_FACET_LIMIT'])).all()
+  facets = catalog_facets(facet_rows, filters, search_term=search_term)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term, facets=facets)
+
+@bp.route('/venues/near')
+def nearby_venues():
+  # ?lat=&lng=[&radius=] lists the venues within `radius` km, closest first;
+  # ?bbox=south,west,north,east the venues in that box. Not cached: every
+  # visitor asks about their own place.
+  area = requested_area()
+  venues = []
+  if area is not None:
+    venues = db.session.execute(nearby_venues_query(area, current_app.config['NEARBY_RESULTS_LIMIT'])).all()
+  return render_template('pages/nearby_venues.html', area=area, venues=venues)
+
+@bp.route('/venues/<int:venue_id>')
+@conditional(lambda venue_id: detail_validators(Venue, Show.venue_id, venue_id))
+@cache.cached('venue:{venue_id}')
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  venue = Venue.query.get_or_404(venue_id)
+  page = request.args.get('page', 1, type=int)
+  shows = split_shows(Show.venue_id, venue_id, Artist, Show.artist_id, page)
+  data = venue_page(venue, shows, page)
+  return render_template('pages/show_venue.html', venue=data)
+
+@bp.route('/venues/<int:venue_id>/calendar.ics')
+@conditional(lambda venue_id: calendar_validators(Venue, Show.venue_id, venue_id))
+def venue_calendar(venue_id):
+  # iCalendar feed of the venue's shows; ?since=<Sync-Token> for the changes only.
+  return calendar_response(Venue, Show.venue_id, venue_id)
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+  from forms import VenueForm
+  form = VenueForm()
+  return render_template('forms/new_venue.html', form=form)
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+  from forms import VenueForm
+  error=False
+  venueform = VenueForm(request.form)
+  try:
+    venue = Venue(
+      name = venueform.name.data,
+      city = venueform.city.data,
+      state = venueform.state.data,
+      address = venueform.address.data,
+      phone = venueform.phone.data,
+      genres = venueform.genres.data,
+      image_link = venueform.image_link.data,
+      facebook_link = venueform.facebook_link.data,
+      website_link = venueform.website_link.data,
+      seeking_talent = venueform.seeking_talent.data,
+      seeking_description = venueform.seeking_description.data
+    )
+    locate(venue)
+    db.session.add(venue)
+    db.session.flush()
+    venue_id = venue.id
+    if venue.image_link:
+      enqueue('check_image_link', kind='venue', id=venue_id)
+    db.session.commit()
+  except: 
+    error = True
+    db.session.rollback()
+    print(sys.exc_info())
+  else:
+    cache.invalidate('venues')
+    venue_names.put(venue_id, venueform.name.data)
+
+  finally:
+    db.session.close()
+    if error: 
+      flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
+    else: 
+      flash('Venue ' + request.form['name'] + ' was successfully listed!')
+    return render_template('pages/home.html')
+  
+# Route to delete a venue Item
+# At the moment feedback on success or failure can't be displayed even though I use flash()
+# I guess it's because of my little understand of how the ajax requests communicates and responds to this route.
+@bp.route('/venues/<venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  error = False
+  try:  
+    namespaces = venue_namespaces(venue_id)
+    Venue.query.filter_by(id=venue_id).delete()
+    db.session.commit()
+  except:
+    error = True 
+    db.session.rollback()
+    print(sys.exc_info())
+  else:
+    cache.invalidate(*namespaces)
+    venue_names.delete(int(venue_id))
+  finally:
+    db.session.close()
+    if not error: 
+      flash('Venue with ID: ' + venue_id + ' was successfully deleted!')
+    else: 
+      flash('An error occurred. Venue ID: ' + venue_id + ' could not be be deleted.')
+  return render_template('pages/home.html')
+
+#  Update
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+  from forms import VenueForm
+  try: 
+    venue = Venue.query.options(noload(Venue.shows)).filter_by(id=venue_id).first()
+    form = VenueForm(obj=venue)
+    form.populate_obj(venue)
+    db.session.commit()
+  except: 
+    db.sesssion.rollback()
+
+  finally:
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+  
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+  from forms import VenueForm
+  venueform = VenueForm(request.form)
+  error = False
+  try: 
+    venue = Venue.query.options(noload(Venue.shows)).filter_by(id=venue_id).first()
+    image_link = venue.image_link
+    venue.name = venueform.name.data
+    venue.city = venueform.city.data
+    venue.state = venueform.state.data
+    venue.address = venueform.address.data
+    venue.phone = venueform.phone.data
+    venue.genres = venueform.genres.data
+    venue.image_link = venueform.image_link.data
+    venue.facebook_link = venueform.facebook_link.data
+    venue.website_link = venueform.website_link.data
+    venue.seeking_talent = venueform.seeking_talent.data
+    venue.seeking_description = venueform.seeking_description.data
+    locate(venue)
+    touch_shows(Show.venue_id, venue_id)
+    namespaces = venue_namespaces(venue_id)
+    if venue.image_link and venue.image_link != image_link:
+      enqueue('check_image_link', kind='venue', id=venue_id)
+    db.session.commit()
+
+  except:
+    error = True
+    db.session.rollback() 
+  else:
+    cache.invalidate(*namespaces)
+    venue_names.put(venue_id, venueform.name.data)
+  finally:
+    db.session.close()
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))